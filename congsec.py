@@ -1,19 +1,56 @@
 # -*- coding: utf-8 -*-
 # congsec_gui.py
 import sys
+import argparse
 import json
 import os
 import re
 import csv
+import io
+import sqlite3
+import tempfile
+import hashlib
+import hmac
+import bisect
+import copy
+import time
+import unicodedata
+import queue
+import socket
+import socketserver
+import threading
+from array import array
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from congsec_client import DAEMON_SOCKET_PATH, DAEMON_CONFIG_KEYS, send_message, read_message, daemon_request, \
+    daemon_available, daemon_config, daemon_messages
+import congsec_client
+if __name__ == "__main__" and sys.argv[1:2] == ["scan"] and "--daemon" in sys.argv:
+    # 提交给常驻服务的命令行扫描只需要客户端，不加载界面和扫描引擎
+    congsec_client.main()
 import chardet
+from collections import Counter, defaultdict
 from datetime import datetime
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QTextEdit, QListWidget, QListWidgetItem, QLabel,
+    QPushButton, QTextEdit, QLabel,
     QSpinBox, QTabWidget, QFileDialog, QMessageBox, QProgressBar,
-    QGroupBox, QFrame, QDialog, QDialogButtonBox, QCheckBox
+    QGroupBox, QFrame, QDialog, QDialogButtonBox, QCheckBox, QLineEdit, QComboBox,
+    QListView, QAbstractItemView
+)
+from PyQt5.QtCore import (
+    Qt, QThread, pyqtSignal, QTimer, QSettings, QAbstractListModel, QModelIndex,
+    QSortFilterProxyModel
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QSettings
 from PyQt5.QtGui import QTextCharFormat, QColor, QSyntaxHighlighter
 from PyQt5.QtWidgets import QPlainTextEdit
 
@@ -45,7 +82,8 @@ class ResultHighlighter(QSyntaxHighlighter):
         label_format.setBackground(QColor(255, 255, 200))
         labels = [
             r"附近行内容:", r"附近文字:", r"文件:", r"-{50}", 
-            r"排除文本:", r"向下行内容:", r"向上行内容:"
+            r"排除文本:", r"向下行内容:", r"向上行内容:", r"涉及文件:",
+            r"上下文（第 \d+-\d+ 行）:", r"所在配置块:", r"列内容:"
         ]
         for label in labels:
             self.highlighting_rules.append((re.compile(label), label_format))
@@ -77,10 +115,1574 @@ class FullscreenResultWindow(QDialog):
         close_btn.clicked.connect(self.accept)
         layout.addWidget(close_btn)
 
+# -------------------- 结果存储类 --------------------
+RESULT_FIELDS = [
+    'keywords', 'line_number', 'nearby_lines', 'nearby_chars',
+    'down_lines', 'up_lines', 'source', 'file_path', 'exclude_text'
+]
+AGGREGATE_FIELDS = ['hit_count', 'files']
+MERGE_FIELDS = ['hit_lines']
+
+
+OUTPUT_MODES = [("full", "完整上下文"), ("count", "仅统计命中次数"), ("files", "仅列出命中文件")]
+
+
+def result_fields(config):
+    mode = config.get("output_mode", "full")
+    if mode == "count":
+        fields = ['keywords', 'hit_count', 'line_number', 'source', 'file_path']
+    elif mode == "files":
+        fields = ['keywords', 'line_number', 'source', 'file_path']
+    else:
+        fields = list(RESULT_FIELDS)
+        if config.get("context_merge", False):
+            fields += MERGE_FIELDS
+    if mode == "full" and config.get("aggregate_hits", False):
+        fields += [field for field in AGGREGATE_FIELDS if field not in fields]
+    return fields
+
+# 列式命中批次中取值为整数的字段；取值缺失时存为 HIT_ABSENT，还原时不生成该键
+HIT_ABSENT = -(1 << 63)
+_HIT_BATCH_MAGIC = b"HITB"
+
+
+class HitBatch:
+    # 列式命中批次：每个字段一列 int64，整数字段直接存值，其余字段存共享字符串表的下标。
+    # to_bytes() 得到一块连续缓冲区，from_buffer() 在任意支持缓冲区协议的对象（bytes、共享内存）上
+    # 直接按 memoryview 读取，跨线程/进程传递时不为每条命中创建对象；需要字典时再逐条还原
+    def __init__(self, fields, kinds, columns, strings, count, sizes=None):
+        self.fields = fields
+        self.kinds = kinds  # 字段 -> "int" / "str"
+        self.columns = columns  # 字段 -> int64 序列（array 或 memoryview）
+        self.strings = strings
+        self.count = count
+        self._sizes = sizes  # 字符串表中各字符串的长度，切片之间共用
+        self._nbytes = None
+
+    @property
+    def sizes(self):
+        if self._sizes is None:
+            self._sizes = self.strings.sizes() if isinstance(self.strings, _BufferStrings) \
+                else array('q', map(len, self.strings))
+        return self._sizes
+
+    @property
+    def nbytes(self):
+        # 内存估算与 ResultStore 对字典行的估算一致（每条 200 字节，加上各字符串字段的 2 倍长度），
+        # 上下文正文都在字符串表里，串行和多进程扫描在同一内存预算下同样溢出
+        if self._nbytes is None:
+            total = 200 * self.count
+            for field in self.fields:
+                if self.kinds[field] == "int" or not self.count:
+                    continue
+                column = self.columns[field]
+                if np is not None:
+                    ids = np.asarray(column, dtype=np.int64)
+                    total += 2 * int(np.asarray(self.sizes, dtype=np.int64)[ids[ids >= 0]].sum())
+                else:
+                    sizes = self.sizes
+                    total += 2 * sum(sizes[i] for i in column if i >= 0)
+            self._nbytes = total
+        return self._nbytes
+
+    @classmethod
+    def from_rows(cls, rows, fields=None):
+        rows = rows if isinstance(rows, list) else list(rows)
+        if fields is None:
+            fields = list(dict.fromkeys(key for row in rows for key in row))
+        # 字段类型：全为整数 int，全为字符串 str，混合（如行号列中的空串）按 JSON 存入字符串表
+        kinds = {}
+        for field in fields:
+            values = [row[field] for row in rows if field in row]
+            if values and all(type(v) is int for v in values):
+                kinds[field] = "int"
+            elif all(isinstance(v, str) for v in values):
+                kinds[field] = "str"
+            else:
+                kinds[field] = "json"
+        ids, strings = {}, []
+        columns = {}
+        for field in fields:
+            column = array('q')
+            if kinds[field] == "int":
+                column.extend(row.get(field, HIT_ABSENT) for row in rows)
+            else:
+                encode = json.dumps if kinds[field] == "json" else None
+                for row in rows:
+                    if field not in row:
+                        column.append(-1)
+                        continue
+                    value = encode(row[field], ensure_ascii=False) if encode else row[field]
+                    string_id = ids.get(value)
+                    if string_id is None:
+                        string_id = ids[value] = len(strings)
+                        strings.append(value)
+                    column.append(string_id)
+            columns[field] = column
+        return cls(fields, kinds, columns, strings, len(rows))
+
+    def to_bytes(self):
+        blob = bytearray()
+        offsets = array('q', [0])
+        for value in self.strings:
+            blob += value.encode("utf-8")
+            offsets.append(len(blob))
+        header = json.dumps({"fields": self.fields, "kinds": self.kinds, "count": self.count,
+                             "strings": len(self.strings)}).encode("utf-8")
+        header += b" " * (-(len(header) + 8) % 8)  # 列数据按 8 字节对齐
+        parts = [_HIT_BATCH_MAGIC, len(header).to_bytes(4, "little"), header]
+        parts.extend(array('q', self.columns[field]).tobytes() for field in self.fields)
+        parts.append(offsets.tobytes())
+        parts.append(bytes(blob))
+        return b"".join(parts)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        view = memoryview(buffer).cast('B')
+        if bytes(view[:4]) != _HIT_BATCH_MAGIC:
+            raise ValueError("不是命中批次数据")
+        header_len = int.from_bytes(view[4:8], "little")
+        header = json.loads(bytes(view[8:8 + header_len]))
+        count, pos = header["count"], 8 + header_len
+        columns = {}
+        for field in header["fields"]:
+            columns[field] = view[pos:pos + 8 * count].cast('q')
+            pos += 8 * count
+        offsets = view[pos:pos + 8 * (header["strings"] + 1)].cast('q')
+        pos += 8 * (header["strings"] + 1)
+        strings = _BufferStrings(view[pos:], offsets)
+        return cls(header["fields"], header["kinds"], columns, strings, count)
+
+    def to_shared_memory(self):
+        # 写入新建的共享内存块并返回块名，由接收方读取后负责 unlink
+        data = self.to_bytes()
+        try:
+            block = shared_memory.SharedMemory(create=True, size=max(1, len(data)), track=False)
+        except TypeError:  # Python < 3.13：块归接收方所有，不让本进程的资源跟踪器登记
+            block = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+            resource_tracker.unregister(block._name, "shared_memory")
+        block.buf[:len(data)] = data
+        name = block.name
+        block.close()
+        return name, len(data)
+
+    @classmethod
+    def from_shared_memory(cls, name, size):
+        # 整块复制一次后立即释放共享内存，不逐条拷贝命中
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            data = bytes(block.buf[:size])
+        finally:
+            block.close()
+            block.unlink()
+        return cls.from_buffer(data)
+
+    @staticmethod
+    def discard_shared_memory(name):
+        # 不读取内容直接删除共享内存块，用于停止扫描后丢弃未取回的批次
+        try:
+            block = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return
+        block.close()
+        block.unlink()
+
+    def slice(self, start, end):
+        # 与原批次共用列缓冲区和字符串表
+        columns = {field: column[start:end] for field, column in self.columns.items()}
+        return HitBatch(self.fields, self.kinds, columns, self.strings, end - start, self.sizes)
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def row(self, i):
+        row = {}
+        for field in self.fields:
+            value = self.columns[field][i]
+            if self.kinds[field] == "int":
+                if value != HIT_ABSENT:
+                    row[field] = value
+            elif value >= 0:
+                row[field] = self.strings[value] if self.kinds[field] == "str" else json.loads(self.strings[value])
+        return row
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.row(i)
+
+    def tuples(self, fields):
+        # 按指定字段逐条产出取值元组，缺失的字段为空串
+        getters = []
+        for field in fields:
+            column = self.columns.get(field)
+            if column is None:
+                getters.append(lambda i: "")
+            elif self.kinds[field] == "int":
+                getters.append(lambda i, c=column: "" if c[i] == HIT_ABSENT else c[i])
+            elif self.kinds[field] == "str":
+                getters.append(lambda i, c=column: self.strings[c[i]] if c[i] >= 0 else "")
+            else:
+                getters.append(lambda i, c=column: json.loads(self.strings[c[i]]) if c[i] >= 0 else "")
+        for i in range(self.count):
+            yield tuple(getter(i) for getter in getters)
+
+    def _weights(self):
+        column = self.columns.get("hit_count")
+        if column is None or self.kinds["hit_count"] != "int":
+            return None
+        if np is not None:
+            values = np.asarray(column, dtype=np.int64)
+            return np.where(values == HIT_ABSENT, 1, values)
+        return [1 if v == HIT_ABSENT else v for v in column]
+
+    def weight(self):
+        # 按 hit_count 计的命中数，缺失时每条计 1
+        weights = self._weights()
+        if weights is None:
+            return self.count
+        return int(weights.sum()) if np is not None else sum(weights)
+
+    def counts(self, field="keywords"):
+        # 按字段分组的命中数，直接在下标列上统计
+        column = self.columns.get(field)
+        counts = Counter()
+        if column is None or self.kinds[field] != "str" or not self.count:
+            return counts
+        weights = self._weights()
+        if np is not None:
+            ids = np.asarray(column, dtype=np.int64)
+            totals = np.bincount(ids[ids >= 0], weights=None if weights is None else weights[ids >= 0])
+            for string_id in np.flatnonzero(totals):
+                counts[self.strings[int(string_id)]] += int(totals[string_id])
+            return counts
+        per_id = Counter()
+        for i, string_id in enumerate(column):
+            if string_id >= 0:
+                per_id[string_id] += 1 if weights is None else weights[i]
+        for string_id, total in per_id.items():
+            counts[self.strings[string_id]] += total
+        return counts
+
+
+class _BufferStrings:
+    # 缓冲区中的字符串表：按下标取用时才解码，解码结果缓存
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def sizes(self):
+        # 按 UTF-8 字节数计，不为估算内存而逐个解码
+        offsets = self.offsets
+        if np is not None:
+            return np.diff(np.asarray(offsets, dtype=np.int64))
+        return array('q', (offsets[i + 1] - offsets[i] for i in range(len(offsets) - 1)))
+
+    def __getitem__(self, i):
+        value = self.cache.get(i)
+        if value is None:
+            value = self.cache[i] = str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+        return value
+
+
+def rows_weight(rows):
+    if isinstance(rows, HitBatch):
+        return rows.weight()
+    return sum(row.get("hit_count", 1) for row in rows)
+
+
+# 结果溢出到磁盘后，界面最多显示的字符数
+DISPLAY_CHAR_LIMIT = 20 * 1024 * 1024
+
+
+class ResultStore:
+    # 按内存预算保存匹配结果，超出预算后溢出到 data 目录下的 SQLite 临时库，
+    # 结果展示、CSV导出和统计均通过迭代本对象读取，无需关心数据位置
+    def __init__(self, memory_budget_mb=0, spill_dir="data", fields=RESULT_FIELDS):
+        self.fields = fields
+        self.memory_budget = max(0, memory_budget_mb) * 1024 * 1024
+        self.spill_dir = spill_dir
+        self.spill_path = None
+        self.conn = None
+        self.chunks = []  # 结果行按块保存：字典列表或 HitBatch
+        self.texts = []
+        self.memory_used = 0
+        self.hit_count = 0
+        self.hit_weight = 0  # 聚合结果按 hit_count 计入的原始命中数
+        self.pending = 0
+
+    @property
+    def spilled(self):
+        return self.conn is not None
+
+    def __len__(self):
+        return self.hit_count
+
+    def __bool__(self):
+        return self.hit_count > 0
+
+    def add(self, result_text, rows):
+        # result_text 为 None 时只追加结果行（报告正文和结果行分开传来时使用）
+        self.hit_count += len(rows)
+        self.hit_weight += rows_weight(rows)
+        if self.conn is not None:
+            self._write(result_text, rows)
+            return
+        if result_text is not None:
+            self.texts.append(result_text)
+            # 粗略估算字符串占用（str 对象头 + 内容）
+            self.memory_used += 2 * len(result_text) + 64
+        if isinstance(rows, HitBatch):
+            # 列式批次原样保存，不展开成字典
+            self.chunks.append(rows)
+            self.memory_used += rows.nbytes
+        elif rows:
+            self.chunks.append(rows)
+            for row in rows:
+                self.memory_used += 200 + sum(2 * len(v) for v in row.values() if isinstance(v, str))
+        if self.memory_budget and self.memory_used > self.memory_budget:
+            self._spill()
+
+    def _spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        fd, self.spill_path = tempfile.mkstemp(prefix="spill_", suffix=".db", dir=self.spill_dir)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.spill_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE texts (seq INTEGER PRIMARY KEY, text TEXT)")
+        self.conn.execute("CREATE TABLE hits (seq INTEGER PRIMARY KEY, keywords TEXT, weight INTEGER, data TEXT)")
+        self.conn.executemany("INSERT INTO texts (text) VALUES (?)", ((t,) for t in self.texts))
+        for chunk in self.chunks:
+            self._insert_rows(chunk)
+        self.conn.commit()
+        self.texts = []
+        self.chunks = []
+        self.memory_used = 0
+
+    def _insert_rows(self, rows):
+        self.conn.executemany(
+            "INSERT INTO hits (keywords, weight, data) VALUES (?, ?, ?)",
+            ((row.get("keywords", ""), row.get("hit_count", 1), json.dumps(row, ensure_ascii=False))
+             for row in rows)
+        )
+
+    def _write(self, result_text, rows):
+        if result_text is not None:
+            self.conn.execute("INSERT INTO texts (text) VALUES (?)", (result_text,))
+        self._insert_rows(rows)
+        self.pending += 1
+        if self.pending >= 200:
+            self.conn.commit()
+            self.pending = 0
+
+    def finish(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.pending = 0
+
+    def __iter__(self):
+        if self.conn is None:
+            for chunk in self.chunks:
+                yield from chunk
+            return
+        cursor = self.conn.execute("SELECT data FROM hits ORDER BY seq")
+        while True:
+            batch = cursor.fetchmany(1000)
+            if not batch:
+                break
+            for (data,) in batch:
+                yield json.loads(data)
+
+    def iter_texts(self):
+        if self.conn is None:
+            yield from self.texts
+            return
+        cursor = self.conn.execute("SELECT text FROM texts ORDER BY seq")
+        while True:
+            batch = cursor.fetchmany(200)
+            if not batch:
+                break
+            for (text,) in batch:
+                yield text
+
+    def render_text(self, max_chars=DISPLAY_CHAR_LIMIT):
+        if self.conn is None:
+            return "\n".join(self.texts)
+        parts, size, shown = [], 0, 0
+        for text in self.iter_texts():
+            if size + len(text) > max_chars:
+                break
+            parts.append(text)
+            size += len(text) + 1
+            shown += 1
+        total = self.conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0]
+        if shown < total:
+            parts.append(f"……结果过多，界面仅显示前 {shown}/{total} 个文件的结果，完整结果请导出CSV")
+        return "\n".join(parts)
+
+    def keyword_counts(self):
+        if self.conn is None:
+            counts = Counter()
+            for chunk in self.chunks:
+                if isinstance(chunk, HitBatch):
+                    counts.update(chunk.counts("keywords"))
+                    continue
+                for row in chunk:
+                    counts[row.get("keywords", "")] += row.get("hit_count", 1)
+            return counts
+        return Counter(dict(self.conn.execute(
+            "SELECT keywords, SUM(weight) FROM hits GROUP BY keywords"
+        ).fetchall()))
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.spill_path and os.path.exists(self.spill_path):
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+        self.spill_path = None
+        self.chunks = []
+        self.texts = []
+
+
+def format_summary(total_files, store, notes=()):
+    lines = [f"处理完成！共处理 {total_files} 个文件，共命中 {store.hit_weight} 条结果"]
+    if store.hit_weight != len(store):
+        lines.append(f"相同命中已聚合为 {len(store)} 条不同结果")
+    counts = store.keyword_counts()
+    if counts:
+        lines.append("命中统计:")
+        for keywords, count in counts.most_common():
+            lines.append(f"  {keywords}: {count}")
+    if store.spilled:
+        lines.append(f"结果超出内存上限，已转存到磁盘: {store.spill_path}")
+    lines.extend(notes)
+    return "\n".join(lines)
+
+# -------------------- 文件去重 --------------------
+DEDUP_SAMPLE_SIZE = 64 * 1024
+
+
+def _hash_file(path, limit=None):
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(1024 * 1024 if remaining is None else min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.digest()
+
+
+def file_fingerprints(paths):
+    # 先按大小分组，大小相同再比较头部样本哈希，样本也相同才计算全文哈希；
+    # 只返回存在重复可能的文件的内容指纹，内容唯一的文件不在结果中
+    by_size = defaultdict(list)
+    for path in paths:
+        try:
+            by_size[os.path.getsize(path)].append(path)
+        except OSError:
+            continue
+    keys = {}
+    for size, group in by_size.items():
+        if len(group) < 2:
+            continue
+        by_sample = defaultdict(list)
+        for path in group:
+            try:
+                by_sample[_hash_file(path, DEDUP_SAMPLE_SIZE)].append(path)
+            except OSError:
+                continue
+        for sample, same in by_sample.items():
+            if len(same) < 2:
+                continue
+            for path in same:
+                if size <= DEDUP_SAMPLE_SIZE:
+                    keys[path] = (size, sample)
+                    continue
+                try:
+                    keys[path] = (size, _hash_file(path))
+                except OSError:
+                    continue
+    return keys
+
+
+def dedup_plan(files, enabled=True):
+    # 内容相同的文件只扫描第一个：返回 (需要扫描的文件, 第一个文件 -> 其余同内容文件)
+    content_keys = file_fingerprints(files) if enabled else {}
+    first_of, followers, submitted = {}, defaultdict(list), []
+    for file_path in files:
+        content_key = content_keys.get(file_path)
+        if content_key is None or content_key not in first_of:
+            if content_key is not None:
+                first_of[content_key] = file_path
+            submitted.append(file_path)
+        else:
+            followers[first_of[content_key]].append(file_path)
+    return submitted, followers
+
+
+def run_label(files):
+    # 结果库中运行批次的默认标签：所扫描文件的公共目录，只有一个文件时为该文件
+    if not files:
+        return ""
+    try:
+        return os.path.commonpath([os.path.abspath(file_path) for file_path in files])
+    except ValueError:  # 不同盘符
+        return ""
+
+
+def retarget_results(result_text, rows, file_path):
+    # 把同内容文件的扫描结果改写为另一路径的结果（报告头两行为文件路径和文件名）
+    body = result_text.split("\n", 2)[2]
+    result_text = f"文件路径: {file_path}\n文件名: {os.path.basename(file_path)}\n{body}"
+    source = os.path.basename(file_path)
+    return result_text, [dict(row, file_path=file_path, source=source) for row in rows]
+
+# -------------------- 命中聚合 --------------------
+# 聚合报告中每条结果最多列出的文件数，完整列表见 CSV 的 files 列
+AGGREGATE_DISPLAY_FILES = 20
+
+
+class HitAggregator:
+    # 按规范化后的上下文指纹边扫描边合并跨文件的相同命中，内存随不同命中数增长而非文件数；
+    # 只用于完整上下文模式。涉及文件列表超出内存预算后，每条结果只保留前 AGGREGATE_DISPLAY_FILES 个路径，文件数照常统计
+    def __init__(self, memory_budget_mb=0):
+        self.entries = {}
+        self.memory_budget = max(0, memory_budget_mb) * 1024 * 1024
+        self.memory_used = 0
+        self.capped = False
+
+    @staticmethod
+    def fingerprint(row):
+        parts = [row["keywords"]]
+        for key in ("nearby_lines", "nearby_chars", "down_lines", "up_lines"):
+            parts.append(" ".join(row[key].split()))
+        data = "\x1f".join(parts).encode("utf-8", "surrogatepass")
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def add(self, rows):
+        for row in rows:
+            key = self.fingerprint(row)
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {"row": row, "hit_count": 0, "files": [], "file_count": 0, "last": None}
+                self.memory_used += 200 + sum(2 * len(v) for v in row.values() if isinstance(v, str))
+            entry["hit_count"] += row.get("hit_count", 1)
+            # 同一文件的结果是连续送入的，只需和最后一个比较
+            file_path = row["file_path"]
+            if entry["last"] != file_path:
+                entry["last"] = file_path
+                entry["file_count"] += 1
+                if not self.capped or len(entry["files"]) < AGGREGATE_DISPLAY_FILES:
+                    entry["files"].append(file_path)
+                    self.memory_used += 2 * len(file_path) + 64
+            if self.memory_budget and not self.capped and self.memory_used > self.memory_budget:
+                self._cap()
+
+    def _cap(self):
+        self.capped = True
+        for entry in self.entries.values():
+            for file_path in entry["files"][AGGREGATE_DISPLAY_FILES:]:
+                self.memory_used -= 2 * len(file_path) + 64
+            del entry["files"][AGGREGATE_DISPLAY_FILES:]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def report(self):
+        result_lines = []
+        rows = []
+        entries = sorted(self.entries.values(), key=lambda e: (e["row"]["keywords"], -e["hit_count"]))
+        for entry in entries:
+            row = dict(entry["row"])
+            files, file_count = entry["files"], entry["file_count"]
+            row["hit_count"] = entry["hit_count"]
+            row["files"] = "; ".join(files)
+            if file_count > len(files):
+                row["files"] += f"; ……等 {file_count} 个文件"
+            rows.append(row)
+
+            result_lines.append(
+                f"关键字列表: {row['keywords']}（共 {entry['hit_count']} 处，涉及 {file_count} 个文件）"
+            )
+            if row["nearby_lines"]:
+                result_lines.append("附近行内容:")
+                result_lines.append(row["nearby_lines"])
+            if row["nearby_chars"]:
+                result_lines.append("附近文字:")
+                result_lines.append(row["nearby_chars"])
+            if row["down_lines"]:
+                result_lines.append("向下行内容:")
+                result_lines.append(row["down_lines"])
+            if row["up_lines"]:
+                result_lines.append("向上行内容:")
+                result_lines.append(row["up_lines"])
+            result_lines.append("涉及文件:")
+            result_lines.extend(f"  {path}" for path in files[:AGGREGATE_DISPLAY_FILES])
+            if file_count > AGGREGATE_DISPLAY_FILES:
+                result_lines.append(f"  ……等 {file_count} 个文件")
+            result_lines.append("-" * 50)
+        return "\n".join(result_lines), rows
+
+# -------------------- 结果库类 --------------------
+RESULT_DB_PATH = os.path.join("data", "results.db")
+SECRET_CONFIG_KEYS = ("worker_token",)  # 不写入结果库、不发给常驻服务和扫描节点的配置项
+
+
+def public_config(config):
+    return {key: value for key, value in config.items() if key not in SECRET_CONFIG_KEYS}
+
+
+class ResultDatabase:
+    # 持久化保存每次运行的命中、运行信息和规则定义，支持跨批次筛选、分组统计和对比
+    def __init__(self, path=RESULT_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                started_at TEXT,
+                finished_at TEXT,
+                total_files INTEGER,
+                hit_count INTEGER DEFAULT 0,
+                label TEXT,
+                config TEXT
+            );
+            CREATE TABLE IF NOT EXISTS rules (
+                run_id INTEGER,
+                rule_id INTEGER,
+                keywords TEXT,
+                definition TEXT,
+                PRIMARY KEY (run_id, rule_id)
+            );
+            CREATE TABLE IF NOT EXISTS hits (
+                id INTEGER PRIMARY KEY,
+                run_id INTEGER,
+                rule_id INTEGER,
+                keywords TEXT,
+                file_path TEXT,
+                source TEXT,
+                line_number INTEGER,
+                nearby_lines TEXT,
+                nearby_chars TEXT,
+                down_lines TEXT,
+                up_lines TEXT,
+                exclude_text TEXT,
+                hit_count INTEGER DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS idx_hits_run_rule ON hits (run_id, keywords, file_path);
+            CREATE INDEX IF NOT EXISTS idx_hits_run_file ON hits (run_id, file_path);
+        """)
+        # 旧版结果库没有 hit_count 列：每条记录计 1 次命中
+        if "hit_count" not in {row[1] for row in self.conn.execute("PRAGMA table_info(hits)")}:
+            self.conn.execute("ALTER TABLE hits ADD COLUMN hit_count INTEGER DEFAULT 1")
+        # 旧版结果库的规则表没有规则指纹列
+        if "rule_hash" not in {row[1] for row in self.conn.execute("PRAGMA table_info(rules)")}:
+            self.conn.execute("ALTER TABLE rules ADD COLUMN rule_hash TEXT")
+        self.rule_ids = {}
+
+    def close(self):
+        self.conn.close()
+
+    def begin_run(self, config, total_files, label=""):
+        cursor = self.conn.execute(
+            "INSERT INTO runs (started_at, total_files, label, config) VALUES (?, ?, ?, ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), total_files, label,
+             json.dumps(public_config(config), ensure_ascii=False))
+        )
+        run_id = cursor.lastrowid
+        # 规则按在本次运行中的下标编号，另存规则定义的指纹供跨批次对照。
+        # 命中记录只带关键字串和排除文本，按两者找回规则编号；两者都相同、仅其他选项不同的规则无法区分，记到第一条
+        self.rule_ids = {}
+        for rule_id, kw in enumerate(config.get("keywords", [])):
+            keywords = " + ".join(kw.get("words", []))
+            definition = json.dumps(kw, ensure_ascii=False, sort_keys=True)
+            self.rule_ids.setdefault((keywords, "; ".join(kw.get("exclude", []))), rule_id)
+            self.conn.execute(
+                "INSERT INTO rules (run_id, rule_id, keywords, definition, rule_hash) VALUES (?, ?, ?, ?, ?)",
+                (run_id, rule_id, keywords, definition,
+                 hashlib.blake2b(definition.encode("utf-8"), digest_size=16).hexdigest())
+            )
+        self.conn.commit()
+        return run_id
+
+    def add_hits(self, run_id, rows):
+        # 仅计数模式和聚合结果的一条记录代表 hit_count 次命中，其余记录计 1 次
+        fields = ["keywords", "file_path", "source", "line_number", "nearby_lines",
+                  "nearby_chars", "down_lines", "up_lines", "exclude_text"]
+        if isinstance(rows, HitBatch):
+            records = (record[:-1] + (record[-1] or 1,) for record in rows.tuples(fields + ["hit_count"]))
+        else:
+            records = (tuple(row[field] for field in fields) + (row.get("hit_count", 1),) for row in rows)
+        self.conn.executemany(
+            "INSERT INTO hits (run_id, rule_id, keywords, file_path, source, line_number, "
+            "nearby_lines, nearby_chars, down_lines, up_lines, exclude_text, hit_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((run_id, self.rule_ids.get((record[0], record[-2]))) + record for record in records)
+        )
+
+    def finish_run(self, run_id, hit_count):
+        self.conn.execute(
+            "UPDATE runs SET finished_at = ?, hit_count = ? WHERE id = ?",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), hit_count, run_id)
+        )
+        self.conn.commit()
+
+    def list_runs(self):
+        return self.conn.execute(
+            "SELECT id, started_at, finished_at, total_files, hit_count, label FROM runs ORDER BY id DESC"
+        ).fetchall()
+
+    def latest_run(self):
+        row = self.conn.execute("SELECT MAX(id) FROM runs").fetchone()
+        return row[0]
+
+    def rules_of_run(self, run_id):
+        return [row[0] for row in self.conn.execute(
+            "SELECT keywords FROM rules WHERE run_id = ? ORDER BY rule_id", (run_id,)
+        )]
+
+    def _where(self, run_id, rule=None, without=None, file_like=None):
+        # rule / without 为规则关键字串精确匹配（走索引），file_like 为路径子串
+        clauses, params = ["run_id = ?"], [run_id]
+        if rule:
+            clauses.append("keywords = ?")
+            params.append(rule)
+        if file_like:
+            clauses.append("file_path LIKE ?")
+            params.append(f"%{file_like}%")
+        if without:
+            clauses.append("file_path NOT IN (SELECT file_path FROM hits WHERE run_id = ? AND keywords = ?)")
+            params.extend([run_id, without])
+        return " AND ".join(clauses), params
+
+    def query_hits(self, run_id, rule=None, without=None, file_like=None, limit=1000):
+        where, params = self._where(run_id, rule, without, file_like)
+        return self.conn.execute(
+            f"SELECT keywords, file_path, line_number, nearby_lines FROM hits WHERE {where} "
+            f"ORDER BY id LIMIT ?", params + [limit]
+        ).fetchall()
+
+    def group_counts(self, run_id, by="rule", rule=None, without=None, file_like=None):
+        where, params = self._where(run_id, rule, without, file_like)
+        if by == "file":
+            sql = (f"SELECT file_path, SUM(hit_count), COUNT(DISTINCT keywords) FROM hits WHERE {where} "
+                   f"GROUP BY file_path ORDER BY SUM(hit_count) DESC")
+        else:
+            sql = (f"SELECT keywords, SUM(hit_count), COUNT(DISTINCT file_path) FROM hits WHERE {where} "
+                   f"GROUP BY keywords ORDER BY SUM(hit_count) DESC")
+        return self.conn.execute(sql, params).fetchall()
+
+    def diff_runs(self, run_id, base_run_id, rule=None, without=None, file_like=None):
+        # 按（规则, 文件）对比两次运行，返回 (新增, 已消失)
+        where_a, params_a = self._where(run_id, rule, without, file_like)
+        where_b, params_b = self._where(base_run_id, rule, without, file_like)
+        select_a = f"SELECT DISTINCT keywords, file_path FROM hits WHERE {where_a}"
+        select_b = f"SELECT DISTINCT keywords, file_path FROM hits WHERE {where_b}"
+        added = self.conn.execute(
+            f"{select_a} EXCEPT {select_b} ORDER BY 1, 2", params_a + params_b
+        ).fetchall()
+        removed = self.conn.execute(
+            f"{select_b} EXCEPT {select_a} ORDER BY 1, 2", params_b + params_a
+        ).fetchall()
+        return added, removed
+
+# -------------------- 行索引 --------------------
+# 除 \n、\r\n 外 str.splitlines 认可的少见换行符（另有单独的 \r）
+_EXOTIC_LINE_BREAK_CHARS = '\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+_SPLITLINES_BREAKS = re.compile('\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+NUMPY_CHUNK_CHARS = 8 * 1024 * 1024
+# 超过该长度的行（压缩 JS、单行 JSON 等）切成虚拟分段，附近行、附近字符都只在分段内计算
+LONG_LINE_CHARS = 64 * 1024
+# 分段尽量切在空白或分隔符后，最多向前回退分段长度的 1/16
+_SEGMENT_BREAK_CHARS = ' \t,;>}'
+
+
+def _char_positions(text, char):
+    # 用 NumPy 在字符缓冲区上向量化查找某个字符的全部偏移
+    if np is None:
+        return [m.start() for m in re.finditer(re.escape(char), text)]
+    code = ord(char)
+    parts = []
+    for offset in range(0, len(text), NUMPY_CHUNK_CHARS):
+        chunk = text[offset:offset + NUMPY_CHUNK_CHARS]
+        if chunk.isascii():
+            codes = np.frombuffer(chunk.encode('ascii'), dtype=np.uint8)
+        else:
+            codes = np.frombuffer(chunk.encode('utf-32-le'), dtype=np.uint32)
+        parts.append(np.flatnonzero(codes == code) + offset)
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(parts)
+
+
+class LineIndex:
+    # 记录每行起止偏移，行号与偏移互查、取行窗口都不需要整文件的行列表；
+    # 分行规则与 str.splitlines 一致。超长行切成虚拟分段后，下标指分段，
+    # physical / columns 记录分段所在的实际行和行内起始字符，row_starts / row_ends 为分段所在实际行的起止偏移
+    def __init__(self, text, segment_chars=0):
+        self.text = text
+        self.crlf = False
+        self.physical = None
+        self.columns = None
+        self.row_starts = self.row_ends = None
+        self._build()
+        if segment_chars > 0:
+            self._segment(segment_chars)
+
+    @property
+    def segmented(self):
+        return self.physical is not None
+
+    def _build(self):
+        text = self.text
+        self.exotic = (any(char in text for char in _EXOTIC_LINE_BREAK_CHARS)
+                       or ('\r' in text and text.count('\r') != text.count('\r\n')))
+        if self.exotic:
+            starts, ends = [0], []
+            for match in _SPLITLINES_BREAKS.finditer(text):
+                ends.append(match.start())
+                starts.append(match.end())
+            ends.append(len(text))
+            if starts[-1] == len(text):
+                starts.pop()
+                ends.pop()
+            self.starts, self.ends = starts, ends
+            if np is not None:
+                self.starts = np.array(starts, dtype=np.int64)
+                self.ends = np.array(ends, dtype=np.int64)
+            return
+
+        newlines = _char_positions(text, '\n')
+        if np is not None:
+            starts = np.concatenate(([0], newlines + 1)).astype(np.int64)
+            ends = np.concatenate((newlines, [len(text)])).astype(np.int64)
+        else:
+            starts = [0] + [p + 1 for p in newlines]
+            ends = list(newlines) + [len(text)]
+        if starts[-1] == len(text):
+            starts, ends = starts[:-1], ends[:-1]
+        if '\r' in text:
+            # 此时每个 \r 都紧跟 \n，行尾去掉 \r
+            self.crlf = True
+            if np is not None:
+                carriage = _char_positions(text, '\r')
+                ends = ends - np.isin(ends - 1, carriage)
+            else:
+                ends = [e - 1 if e > 0 and text[e - 1] == '\r' else e for e in ends]
+        self.starts, self.ends = starts, ends
+
+    def _segment(self, limit):
+        lengths = [e - s for s, e in zip(self.starts, self.ends)] if np is None else self.ends - self.starts
+        long_rows = [i for i, n in enumerate(lengths) if n > limit] if np is None \
+            else np.flatnonzero(lengths > limit).tolist()
+        if not long_rows:
+            return
+        starts, ends, physical, columns = [], [], [], []
+        prev = 0
+        for row in long_rows + [len(self.starts)]:
+            starts.extend(self.starts[prev:row])
+            ends.extend(self.ends[prev:row])
+            physical.extend(range(prev, row))
+            columns.extend([0] * (row - prev))
+            if row == len(self.starts):
+                break
+            line_start, line_end = int(self.starts[row]), int(self.ends[row])
+            pos = line_start
+            while line_end - pos > limit:
+                cut = pos + limit
+                back = max(self.text.rfind(c, cut - limit // 16, cut) for c in _SEGMENT_BREAK_CHARS)
+                if back >= 0:
+                    cut = back + 1
+                starts.append(pos)
+                ends.append(cut)
+                physical.append(row)
+                columns.append(pos - line_start)
+                pos = cut
+            starts.append(pos)
+            ends.append(line_end)
+            physical.append(row)
+            columns.append(pos - line_start)
+            prev = row + 1
+        if np is not None:
+            starts = np.array(starts, dtype=np.int64)
+            ends = np.array(ends, dtype=np.int64)
+            self.row_starts = self.starts[physical]
+            self.row_ends = self.ends[physical]
+        else:
+            self.row_starts = [self.starts[row] for row in physical]
+            self.row_ends = [self.ends[row] for row in physical]
+        self.starts, self.ends = starts, ends
+        self.physical, self.columns = physical, columns
+
+    def extent(self, i, pad):
+        # 第 i 行或分段向两侧各延伸 pad 个字符（不超出所在实际行）的起止偏移；
+        # 相邻分段借此互相重叠，跨越切点的关键字和附近文字不会丢失
+        start, end = int(self.starts[i]), int(self.ends[i])
+        if self.physical is None:
+            return start, end
+        return max(int(self.row_starts[i]), start - pad), min(int(self.row_ends[i]), end + pad)
+
+    def line_no(self, i):
+        # 下标 i 的行或分段所在的实际行号（从 1 开始）
+        return i + 1 if self.physical is None else self.physical[i] + 1
+
+    def describe(self, i):
+        if self.physical is None or not self.columns[i]:
+            return f"第 {self.line_no(i)} 行"
+        return f"第 {self.line_no(i)} 行第 {self.columns[i] + 1} 字符起"
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, i):
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def with_text(self, text):
+        # 与原文等长的另一份文本（如大小写归一后）直接共用本索引的行偏移和分段
+        clone = copy.copy(self)
+        clone.text = text
+        return clone
+
+    def window(self, start, end):
+        # 第 start 行（含）到第 end 行（不含），从 0 开始计数，越界部分自动截断
+        start = max(0, start)
+        end = min(len(self.starts), end)
+        if start >= end:
+            return ""
+        if self.exotic:
+            if self.physical is not None:
+                # 同一实际行的分段之间不加换行
+                return "".join(("\n" if i > start and self.columns[i] == 0 else "") + self.line(i)
+                               for i in range(start, end))
+            return "\n".join(self.line(i) for i in range(start, end))
+        block = self.text[self.starts[start]:self.ends[end - 1]]
+        return block.replace('\r\n', '\n') if self.crlf else block
+
+    def lines_of(self, offsets):
+        # 偏移列表 -> 去重排序后的行号列表（从 0 开始）
+        if not len(offsets):
+            return []
+        if np is not None:
+            rows = np.searchsorted(self.starts, np.asarray(offsets, dtype=np.int64), side='right') - 1
+            return np.unique(rows).tolist()
+        rows = {bisect.bisect_right(self.starts, offset) - 1 for offset in offsets}
+        return sorted(rows)
+
+
+def find_line_offsets(text, word, exotic=False):
+    # 查找 word 所在各行中的一个出现位置：命中后直接跳到下一行继续找
+    offsets = []
+    find = text.find
+    pos = find(word)
+    while pos != -1:
+        offsets.append(pos)
+        if exotic:
+            pos = find(word, pos + 1)
+            continue
+        line_end = find('\n', pos + len(word))
+        if line_end == -1:
+            break
+        pos = find(word, line_end + 1)
+    return offsets
+
+INDENT_STEPS = 256  # 向量化逐字符跳过缩进的最多步数，更深的缩进逐行计算
+
+
+def _line_indents(text, starts, ends):
+    # NumPy 版本：各行行首空格/制表符的个数，以及跳过缩进后的首字符是否为 "}"；空行缩进记为 -1
+    indents = np.full(len(starts), -1, dtype=np.int64)
+    closing = np.zeros(len(starts), dtype=bool)
+    for offset in range(0, len(text), NUMPY_CHUNK_CHARS):
+        chunk = text[offset:offset + NUMPY_CHUNK_CHARS + INDENT_STEPS]
+        if chunk.isascii():
+            codes = np.frombuffer(chunk.encode('ascii'), dtype=np.uint8)
+        else:
+            codes = np.frombuffer(chunk.encode('utf-32-le'), dtype=np.uint32)
+        codes = np.concatenate((codes, [0]))
+        rows = np.arange(*np.searchsorted(starts, [offset, offset + NUMPY_CHUNK_CHARS]))
+        pos = starts[rows] - offset
+        limit = np.minimum(ends[rows] - offset, len(chunk))
+        todo = np.arange(len(rows))
+        for _ in range(INDENT_STEPS):
+            c = codes[pos[todo]]
+            todo = todo[((c == 32) | (c == 9)) & (pos[todo] < limit[todo])]
+            if not len(todo):
+                break
+            pos[todo] += 1
+        for i in todo:
+            # 缩进超过 INDENT_STEPS 的行
+            line = text[starts[rows[i]]:ends[rows[i]]]
+            pos[i] = starts[rows[i]] - offset + len(line) - len(line.lstrip(' \t'))
+            limit[i] = ends[rows[i]] - offset
+        filled = pos < limit
+        rows, pos = rows[filled], pos[filled]
+        indents[rows] = pos - (starts[rows] - offset)
+        inside = pos < len(chunk)
+        closing[rows[inside]] = codes[pos[inside]] == ord('}')
+        closing[rows[~inside]] = [text[offset + p] == '}' for p in pos[~inside]]
+    return indents, closing
+
+
+class BlockIndex:
+    # 配置块索引：按缩进建立块层次。每个非空行开启一个块，块内是其后缩进更深的行（含空行），
+    # 直到下一个缩进不深于它的非空行；以 "}" 开头的闭合行计入它所闭合的块（如顶格的 "}"）。
+    # 某行所在的块取包含它的最内层块：有下级行的行（interface / router 等）取自己开启的块，
+    # 其余行取上级行的块，顶格而没有下级的行（hostname、! 分隔行等）自成一块；
+    # 第一个顶格行之前的空行和没有上级的缩进行同属开头一块
+    def __init__(self, index):
+        self.line_count = len(index)
+        if np is not None and not index.exotic:
+            if index.segmented:
+                first = np.flatnonzero(np.asarray(index.columns) == 0)
+                starts, ends = index.starts[first], index.row_ends[first]
+            else:
+                first = None
+                starts, ends = index.starts, index.ends
+            indents, closing = _line_indents(index.text, starts, ends)
+            filled = np.flatnonzero(indents >= 0)
+            heads = filled if first is None else first[filled]
+            depths = indents[filled] + closing[filled]
+        else:
+            # 超长行的后续分段随首个分段，不参与分块
+            first = [i for i, column in enumerate(index.columns) if not column] if index.segmented \
+                else range(self.line_count)
+            if not index.exotic:
+                lines = index.text.split('\n')
+            elif index.segmented:
+                lines = (index.text[index.row_starts[i]:index.row_ends[i]] for i in first)
+            else:
+                lines = (index.line(i) for i in first)
+            heads, depths = [], []
+            for i, line in zip(first, lines):
+                body = line.lstrip(' \t')
+                if body and body != '\r':
+                    heads.append(i)
+                    depths.append(len(line) - len(body) + (body[0] == '}'))
+        # 每个非空行所开启的块的结束行，以及它的上级行（-1 表示没有）
+        levels = np.unique(depths) if np is not None else ()
+        if np is not None and len(levels) <= 64:
+            heads = np.asarray(heads, dtype=np.int64)
+            depths = np.asarray(depths, dtype=np.int64)
+            ends = np.full(len(heads), self.line_count, dtype=np.int64)
+            parents = np.full(len(heads), -1, dtype=np.int64)
+            for depth in levels:
+                same = np.flatnonzero(depths == depth)
+                closing = np.flatnonzero(depths <= depth)
+                k = np.searchsorted(closing, same, side='right')
+                inside = k < len(closing)
+                ends[same[inside]] = heads[closing[k[inside]]]
+                upper = np.flatnonzero(depths < depth)
+                k = np.searchsorted(upper, same) - 1
+                parents[same[k >= 0]] = upper[k[k >= 0]]
+            children = np.zeros(len(heads), dtype=bool)
+            children[:-1] = depths[1:] > depths[:-1]
+            owner = np.where(children | (parents < 0), np.arange(len(heads)), parents)
+            top = np.flatnonzero(depths == 0)
+            self.leading = (0, int(heads[top[0]]) if len(top) else self.line_count)
+            self.heads = heads
+            self.starts = heads[owner]
+            self.ends = ends[owner]
+            orphans = (parents < 0) & ~children & (depths > 0)
+            self.starts[orphans], self.ends[orphans] = self.leading
+        else:
+            ends = [self.line_count] * len(heads)
+            parents = [-1] * len(heads)
+            stack = []
+            for k, depth in enumerate(depths):
+                while stack and depths[stack[-1]] >= depth:
+                    ends[stack.pop()] = heads[k]
+                parents[k] = stack[-1] if stack else -1
+                stack.append(k)
+            top = next((heads[k] for k, depth in enumerate(depths) if depth == 0), self.line_count)
+            self.leading = (0, top)
+            self.heads, self.starts, self.ends = heads, [], []
+            for k, parent in enumerate(parents):
+                if k + 1 < len(heads) and depths[k + 1] > depths[k]:
+                    block = (heads[k], ends[k])
+                elif parent >= 0:
+                    block = (heads[parent], ends[parent])
+                else:
+                    block = (heads[k], ends[k]) if depths[k] == 0 else self.leading
+                self.starts.append(block[0])
+                self.ends.append(block[1])
+            if np is not None:
+                # 缩进层级过多时逐行计算，结果仍转成数组供 blocks_of 使用
+                self.heads, self.starts, self.ends = (
+                    np.asarray(values, dtype=np.int64) for values in (heads, self.starts, self.ends))
+
+    def block_of(self, line_idx):
+        k = bisect.bisect_right(self.heads, line_idx) - 1
+        if k < 0:
+            return self.leading
+        return int(self.starts[k]), int(self.ends[k])
+
+    def blocks_of(self, lines):
+        # NumPy 版本：一次求出多行所在块的范围
+        if not len(self.heads):
+            return np.zeros(len(lines), dtype=np.int64), np.full(len(lines), self.line_count, dtype=np.int64)
+        k = np.searchsorted(self.heads, lines, side='right') - 1
+        before = k < 0
+        k = np.maximum(k, 0)
+        return np.where(before, self.leading[0], self.starts[k]), np.where(before, self.leading[1], self.ends[k])
+
+
+class WordPositions:
+    # 按需记录关键字在整个文件中的全部出现位置（每个关键字只扫描一次，多条规则共享），
+    # 用二分查找回答“关键字是否在某锚点附近 N 个字符内 / 某些行范围内”
+    def __init__(self, index):
+        self.index = index
+        self.offsets = {}
+        self.lines = {}
+        self._blocks = None
+
+    @property
+    def blocks(self):
+        # 只有用到配置块上下文的规则时才建立块索引
+        if self._blocks is None:
+            self._blocks = BlockIndex(self.index)
+        return self._blocks
+
+    def offsets_of(self, word):
+        offsets = self.offsets.get(word)
+        if offsets is None:
+            offsets = []
+            find = self.index.text.find
+            pos = find(word)
+            while pos != -1:
+                offsets.append(pos)
+                pos = find(word, pos + 1)
+            self.offsets[word] = offsets
+        return offsets
+
+    def lines_of(self, word):
+        lines = self.lines.get(word)
+        if lines is None:
+            lines = self.lines[word] = self.index.lines_of(self.offsets_of(word))
+        return lines
+
+    def near_anchors(self, word, anchors, chars, line_start, line_end):
+        # 关键字需完整落在某个锚点之前或之后 chars 个字符内（不跨行）
+        offsets = self.offsets_of(word)
+        size = len(word)
+        for start, end in anchors:
+            for low, high in ((max(line_start, start - chars), start - size),
+                              (end, min(line_end, end + chars) - size)):
+                if low <= high:
+                    i = bisect.bisect_left(offsets, low)
+                    if i < len(offsets) and offsets[i] <= high:
+                        return True
+        return False
+
+    def in_spans(self, word, spans):
+        # 关键字是否完整落在某个偏移区间 [lo, hi) 内
+        offsets = self.offsets_of(word)
+        size = len(word)
+        for lo, hi in spans:
+            i = bisect.bisect_left(offsets, lo)
+            if i < len(offsets) and offsets[i] <= hi - size:
+                return True
+        return False
+
+    def in_line_ranges(self, word, ranges):
+        lines = self.lines_of(word)
+        for start, end in ranges:
+            i = bisect.bisect_left(lines, start)
+            if i < len(lines) and lines[i] < end:
+                return True
+        return False
+
+    def filter_lines(self, rule, lines):
+        # NumPy 向量化版本：一次性判断全部候选行，返回满足邻近条件的行号列表
+        lines = np.asarray(lines, dtype=np.int64)
+        if not len(lines):
+            return []
+        if rule.multi_line_exclude or rule.block_context:
+            ok = np.ones(len(lines), dtype=bool)
+            if rule.block_context:
+                ranges = [self.blocks.blocks_of(lines)]
+            else:
+                ranges = rule.line_ranges(lines, len(self.index))
+            for word in rule.words[1:]:
+                word_lines = np.asarray(self.lines_of(word), dtype=np.int64)
+                found = np.zeros(len(lines), dtype=bool)
+                for start, end in ranges:
+                    # 行范围内出现次数 = 范围右端之前的次数 - 左端之前的次数
+                    found |= np.searchsorted(word_lines, end) > np.searchsorted(word_lines, start)
+                ok &= found
+            return lines[ok].tolist()
+
+        text = self.index.text
+        first = rule.words[0]
+        anchor_list = []
+        pos = text.find(first)
+        while pos != -1:
+            anchor_list.append(pos)
+            pos = text.find(first, pos + len(first))
+        anchor_starts = np.asarray(anchor_list, dtype=np.int64)
+        anchor_ends = anchor_starts + len(first)
+        anchor_lines = np.searchsorted(self.index.starts, anchor_starts, side='right') - 1
+        # 超长行的分段之间，附近字符按所在实际行的边界计算
+        line_starts = (self.index.starts if self.index.row_starts is None else self.index.row_starts)[anchor_lines]
+        line_ends = (self.index.ends if self.index.row_ends is None else self.index.row_ends)[anchor_lines]
+        chars = rule.nearby_chars
+        ok = np.ones(len(anchor_starts), dtype=bool)
+        line_ok = np.ones(len(self.index), dtype=bool)
+        for word in rule.words[1:]:
+            if word in first:
+                continue
+            offsets = np.asarray(self.offsets_of(word), dtype=np.int64)
+            found = np.zeros(len(anchor_starts), dtype=bool)
+            if len(offsets):
+                for low, high in ((np.maximum(line_starts, anchor_starts - chars), anchor_starts - len(word)),
+                                  (anchor_ends, np.minimum(line_ends, anchor_ends + chars) - len(word))):
+                    idx = np.searchsorted(offsets, low)
+                    hit = offsets[np.minimum(idx, len(offsets) - 1)]
+                    found |= (idx < len(offsets)) & (hit <= high) & (low <= high)
+            # 同一行任一锚点满足即可
+            word_line_ok = np.zeros(len(self.index), dtype=bool)
+            word_line_ok[anchor_lines[found]] = True
+            line_ok &= word_line_ok
+        return lines[line_ok[lines]].tolist()
+
+# -------------------- 大小写与全半角归一 --------------------
+# 每种归一方式一张逐字符映射表，只收录文件里实际出现过的非 ASCII 字符
+_FOLD_TABLES = {}
+_LINE_BREAK_CHARS = '\n\r' + _EXOTIC_LINE_BREAK_CHARS
+
+
+def _fold_char(char, nfkc, lower):
+    folded = unicodedata.normalize("NFKC", char) if nfkc else char
+    if lower:
+        folded = folded.lower()
+    # 只接受一对一的映射（全角转半角、大写转小写等），ﬁ、ß 之类会变长的字符保持原样；换行类字符不动
+    if len(folded) != 1 or char in _LINE_BREAK_CHARS or folded in _LINE_BREAK_CHARS:
+        return char
+    return folded
+
+
+def fold_text(text, nfkc=False, lower=False):
+    # 逐字符归一，结果与原文等长，任一偏移在两者中指向同一个字符，
+    # 因此可以在归一后的文本上匹配、按同一偏移从原文取上下文
+    if not (nfkc or lower):
+        return text
+    if text.isascii():
+        return text.lower() if lower else text
+    table = _FOLD_TABLES.setdefault((nfkc, lower), {})
+    for char in set(text):
+        if ord(char) not in table:
+            table[ord(char)] = _fold_char(char, nfkc, lower)
+    return text.translate(table)
+
+# -------------------- 规则编译 --------------------
+REGEX_MAX_LENGTH = 1000
+
+_REPEAT_OPS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+
+def _has_nested_repeat(items, inside_unbounded=False):
+    # 无界重复内再嵌套无界重复（如 (a+)+）会导致灾难性回溯
+    for op, av in items:
+        if op in _REPEAT_OPS:
+            unbounded = av[1] == sre_parse.MAXREPEAT
+            if unbounded and inside_unbounded:
+                return True
+            if _has_nested_repeat(av[2], inside_unbounded or unbounded):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            if _has_nested_repeat(av[-1], inside_unbounded):
+                return True
+        elif op is sre_parse.BRANCH:
+            if any(_has_nested_repeat(branch, inside_unbounded) for branch in av[1]):
+                return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if _has_nested_repeat(av[1], inside_unbounded):
+                return True
+    return False
+
+
+def validate_regex(pattern, flags=0):
+    if len(pattern) > REGEX_MAX_LENGTH:
+        raise ValueError(f"正则过长（超过 {REGEX_MAX_LENGTH} 个字符）: {pattern[:50]}...")
+    try:
+        compiled = re.compile(pattern, flags)
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        raise ValueError(f"正则语法错误: {pattern}（{e}）")
+    if compiled.search("") is not None:
+        raise ValueError(f"正则可以匹配空字符串，会命中每一行: {pattern}")
+    if _has_nested_repeat(list(parsed)):
+        raise ValueError(f"正则包含嵌套的无界重复，可能导致回溯卡死: {pattern}")
+    return compiled
+
+
+def _required_literals(items):
+    # 返回匹配必然包含的字面量组：组间为“且”，组内候选为“或”
+    groups = []
+    run = []
+
+    def flush():
+        if run:
+            groups.append(["".join(run)])
+            run.clear()
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            if not av[1] & re.IGNORECASE:
+                groups.extend(_required_literals(av[-1]))
+        elif op in _REPEAT_OPS and av[0] >= 1:
+            groups.extend(_required_literals(av[2]))
+        elif op is sre_parse.BRANCH:
+            options = []
+            for branch in av[1]:
+                sub = _required_literals(branch)
+                if not sub:
+                    options = None
+                    break
+                options.extend(max(sub, key=lambda group: min(len(lit) for lit in group)))
+            if options:
+                groups.append(options)
+    flush()
+    return groups
+
+
+def regex_prefilter(pattern):
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+    groups = _required_literals(list(parsed))
+    # 只保留最有区分度的两组，字面量越长越不容易误选
+    groups.sort(key=lambda group: min(len(lit) for lit in group), reverse=True)
+    return groups[:2]
+
+
+class CompiledRule:
+    # 运行前编译一次的规则：文本规则按子串匹配，正则规则先用必需字面量预筛再跑正则
+    def __init__(self, kw, config):
+        self.kw = kw
+        # 忽略大小写 / NFKC 归一（全角转半角等）：关键字、排除文本和文件内容按同一方式逐字符归一后再比较
+        self.ignore_case = kw.get("ignore_case", False)
+        self.nfkc = kw.get("nfkc", False)
+        self.fold = (self.nfkc, self.ignore_case) if self.nfkc or self.ignore_case else None
+        words = kw.get("words", [])
+        exclude = kw.get("exclude", [])
+        self.label = " + ".join(words)
+        self.exclude_text = "; ".join(exclude)
+        # 正则本身不做归一（会破坏转义），NFKC 时应按半角书写；忽略大小写改用 re.IGNORECASE
+        self.words = words if self.fold is None or kw.get("type", "text") == "regex" \
+            else [fold_text(word, *self.fold) for word in words]
+        self.exclude = exclude if self.fold is None else [fold_text(e, *self.fold) for e in exclude]
+        self.nearby_lines = kw.get("nearby_lines", config["nearby_lines"])
+        self.nearby_chars = kw.get("nearby_chars", config["nearby_chars"])
+        self.down_lines = kw.get("down_lines", 0)
+        self.up_lines = kw.get("up_lines", 0)
+        self.exclude_nearby = kw.get("exclude_nearby", True)
+        self.multi_line_exclude = kw.get("multi_line_exclude", False)
+        self.max_hits = kw.get("max_hits", config.get("max_hits", 0))
+        # 上下文取命中行所在的配置块，且其余关键字需出现在同一块中
+        self.block_context = kw.get("context_mode", "lines") == "block"
+        # 表格文件中关键字和排除文本只在这些列中查找，为空时查找整行
+        self.columns = [c.strip() for c in kw.get("columns", []) if c.strip()]
+        self.is_regex = kw.get("type", "text") == "regex"
+        self.prefilter = []
+        self.patterns = []
+        if not self.words:
+            return
+        # 超长行相邻分段的重叠字符数：文本规则取最长关键字，正则取最长表达式的长度作估计
+        self.reach = max(len(word) for word in self.words)
+        if self.is_regex:
+            flags = re.IGNORECASE if self.ignore_case else 0
+            self.patterns = [validate_regex(word, flags) for word in self.words]
+            self.prefilter = regex_prefilter(self.words[0])
+            if self.fold is not None:
+                self.prefilter = [[fold_text(lit, *self.fold) for lit in group] for group in self.prefilter]
+        else:
+            self.prefilter = [[self.words[0]]]
+        # 文本规则的其余关键字可用位置引擎判断；含方括号时可能跨越附近文字里的 [..] 标记，需走文本比较
+        self.positional = not self.is_regex and not any(
+            '[' in word or ']' in word for word in self.words[1:]
+        )
+
+    def line_ranges(self, line_idx, line_count):
+        # 附近、向下、向上内容的行范围（从 0 开始，左闭右开），line_idx 可以是 NumPy 数组
+        clip = (lambda v: np.clip(v, 0, line_count)) if np is not None and not isinstance(line_idx, int) \
+            else (lambda v: max(0, min(line_count, v)))
+        ranges = [(clip(line_idx - self.nearby_lines), clip(line_idx + 1 + self.nearby_lines))]
+        if self.down_lines > 0:
+            ranges.append((clip(line_idx + 1), clip(line_idx + 1 + self.down_lines)))
+        elif self.down_lines < 0:
+            ranges.append((clip(line_idx + self.down_lines), clip(line_idx + 1)))
+        if self.up_lines > 0:
+            ranges.append((clip(line_idx - self.up_lines), clip(line_idx)))
+        elif self.up_lines < 0:
+            ranges.append((clip(line_idx), clip(line_idx - self.up_lines)))
+        return ranges
+
+    @property
+    def anchor(self):
+        # 文本规则的首关键字模式按需编译，规则很多时不必在启动时全部编译
+        if not self.patterns:
+            self.patterns = [re.compile(re.escape(self.words[0]))]
+        return self.patterns[0]
+
+    def may_match(self, text):
+        return all(any(lit in text for lit in group) for group in self.prefilter)
+
+    def candidate(self, line):
+        # 该行是否出现首个关键字
+        if not self.may_match(line):
+            return False
+        return not self.is_regex or self.anchor.search(line) is not None
+
+    def candidate_lines(self, index):
+        # 用首个字面量组在整段文本上定位候选行（行号从 0 开始），无字面量时返回全部行
+        if not self.prefilter:
+            return range(len(index))
+        offsets = []
+        for lit in self.prefilter[0]:
+            found = find_line_offsets(index.text, lit, index.exotic or index.segmented)
+            offsets.extend(found)
+            if index.segmented and self.is_regex:
+                # 正则匹配可能从字面量之前的上一个分段开始
+                offsets.extend(max(0, offset - self.reach) for offset in found)
+        return index.lines_of(offsets)
+
+    def contains(self, index, text):
+        if self.is_regex:
+            return self.patterns[index].search(text) is not None
+        return self.words[index] in text
+
+
+def normalize_rule(kw):
+    # 兼容旧版配置和外部规则包，返回补全默认值的规则字典，无法识别时返回 None
+    if isinstance(kw, str):
+        kw = {"words": [kw]}
+    if not isinstance(kw, dict):
+        return None
+    if "word" in kw:
+        kw["words"] = [kw.pop("word")]
+    kw.setdefault("words", [])
+    kw.setdefault("exclude", [])
+    kw.setdefault("enabled", True)
+    kw.setdefault("down_lines", 0)
+    kw.setdefault("up_lines", 0)
+    kw.setdefault("exclude_nearby", True)
+    kw.setdefault("multi_line_exclude", False)
+    kw.setdefault("context_mode", "lines")
+    kw.setdefault("ignore_case", False)
+    kw.setdefault("nfkc", False)
+    kw.setdefault("columns", [])
+    kw.setdefault("type", "text")
+    kw.setdefault("category", "")
+    return kw
+
+
+def rule_key(kw):
+    return (kw.get("type", "text"), tuple(kw.get("words", [])), tuple(kw.get("exclude", [])))
+
+
+def compile_rules(config):
+    return [CompiledRule(kw, config) for kw in config["keywords"]]
+
+# -------------------- 表格文件 --------------------
+TABLE_DELIMITERS = {".csv": None, ".tsv": "\t"}
+
+
+def table_delimiter(file_path, sample):
+    # .tsv 固定制表符；.csv 从开头样本推断分隔符（流日志导出常用 ; 或 |），推断失败按逗号
+    ext = os.path.splitext(file_path)[1].lower()
+    if TABLE_DELIMITERS.get(ext):
+        return TABLE_DELIMITERS[ext]
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+class _PrefixReader(io.RawIOBase):
+    # 只读出文件前 limit 个字节的原始流，用于超出单文件大小预算的表格文件
+    def __init__(self, raw, limit):
+        self.raw = raw
+        self.limit = limit
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        return self.raw.seek(pos, whence)
+
+    def tell(self):
+        return self.raw.tell()
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.limit - self.raw.tell())
+        if size <= 0:
+            return 0
+        return self.raw.readinto(memoryview(buffer)[:size])
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def open_table(file_path, encoding, limit=0):
+    # 以文本方式打开表格文件，limit 大于 0 时只读前 limit 个字节
+    if not limit:
+        return open(file_path, 'r', encoding=encoding, errors='ignore', newline='')
+    raw = _PrefixReader(open(file_path, 'rb'), limit)
+    return io.TextIOWrapper(io.BufferedReader(raw), encoding=encoding, errors='ignore', newline='')
+
+
+def iter_table_rows(lines, delimiter, keep_text=True):
+    # 流式解析表格，逐条产出 (原始行文本, 字段列表)；引号内含换行的记录会跨多个物理行。
+    # keep_text 为假时不拼接原始行文本，产出 (None, 字段列表)
+    if not keep_text:
+        for fields in csv.reader(lines, delimiter=delimiter):
+            yield None, fields
+        return
+    raw = []
+
+    def feed():
+        for line in lines:
+            raw.append(line)
+            yield line
+
+    for fields in csv.reader(feed(), delimiter=delimiter):
+        row_text = "".join(raw).rstrip("\r\n")
+        raw.clear()
+        yield row_text, fields
+
+
 # -------------------- 工作线程类 --------------------
 class WorkerThread(QThread):
     progress_signal = pyqtSignal(int, int, str)
-    result_signal = pyqtSignal(str, list)
+    result_signal = pyqtSignal(str, object)
     finished_signal = pyqtSignal()
     error_signal = pyqtSignal(str)
 
@@ -92,32 +1694,78 @@ class WorkerThread(QThread):
         self.chunk_size = 1024 * 1024  # 1MB chunks for large files
         self.auto_detect_encoding = auto_detect_encoding
         self.encoding_cache = {}  # 缓存已检测的文件编码
+        self.rule_cache = None  # (config, 编译后的规则)
+        self.overruns = []  # 超出单文件时间/大小预算的 (文件, 说明)
+        self.duplicate_files = 0
+        self.coordinator = None  # 分布式扫描时的协调器
+        self.balance = []  # 并行扫描的调度与负载统计
+        self.node_notes = []  # 分布式扫描实际使用的节点数及停用原因
 
     def run(self):
         try:
             total_files = len(self.files)
-            all_results = []
-            result_texts = []
-            
-            for i, file_path in enumerate(self.files):
-                if not self.is_running:
-                    break
-                self.progress_signal.emit(i + 1, total_files, os.path.basename(file_path))
+            self.compile_rules(self.config)
+            summary_only = self.config.get("output_mode", "full") in ("count", "files")
+            # 仅统计 / 仅列文件模式的结果行本来就是每个文件每条规则一条，没有上下文可聚合
+            aggregator = HitAggregator(self.config.get("memory_budget_mb", 0)) \
+                if self.config.get("aggregate_hits", False) and not summary_only else None
+            store = ResultStore(
+                self.config.get("memory_budget_mb", 0),
+                fields=result_fields(self.config)
+            )
+            hit_total = 0
+            notes = []
+            self.duplicate_files = 0
+            self.overruns = []
+            self.balance = []
+            self.node_notes = []
+            result_db, run_id = None, None
+            if self.config.get("persist_results", False):
+                result_db = ResultDatabase(self.config.get("result_db_path", RESULT_DB_PATH))
+                run_id = result_db.begin_run(self.config, total_files,
+                                             self.config.get("run_label") or run_label(self.files))
+
+            nodes = [node for node in self.config.get("worker_nodes", []) if node.strip()]
+            processes = self.config.get("scan_processes", 0)
+            if nodes:
+                scans = self.scan_remote(nodes)
+            elif processes > 1:
+                scans = self.scan_parallel(processes)
+            else:
+                scans = self.scan_local()
+            for file_path, scan in scans:
+                if scan is None:
+                    continue  # Skip binary files
                 try:
-                    content = self.read_file_optimized(file_path)
-                    if content is None:
-                        continue  # Skip binary files
-
-                    result_text, file_results = self.process_text(content, self.config, file_path)
-                    all_results.extend(file_results)
-                    result_texts.append(result_text)
+                    result_text, file_results = scan
+                    hit_total += rows_weight(file_results)
+                    if aggregator is not None:
+                        aggregator.add(file_results)
+                    elif file_results or not summary_only:
+                        store.add(result_text, file_results)
+                    if result_db is not None and file_results:
+                        result_db.add_hits(run_id, file_results)
                 except Exception as e:
                     self.error_signal.emit(f"读取文件 {file_path} 时出错: {str(e)}")
                     continue
 
-            full_result_text = "\n".join(result_texts)
-            full_result_text = f"处理完成！共处理 {total_files} 个文件\n\n" + full_result_text
-            self.result_signal.emit(full_result_text, all_results)
+            if aggregator is not None:
+                store.add(*aggregator.report())
+                if aggregator.capped:
+                    notes.append(f"聚合结果超出内存预算，每条结果只保留前 {AGGREGATE_DISPLAY_FILES} 个涉及文件的路径")
+            store.finish()
+            notes.extend(self.node_notes)
+            if self.duplicate_files:
+                notes.append(f"{self.duplicate_files} 个文件与已扫描文件内容相同，已复用扫描结果")
+            notes.extend(self.balance)
+            if self.overruns:
+                overrun_files = len({path for path, _ in self.overruns})
+                notes.append(f"{overrun_files} 个文件超出单文件预算，结果不完整:")
+                notes.extend(f"  {path}: {reason}" for path, reason in self.overruns)
+            if result_db is not None:
+                result_db.finish_run(run_id, hit_total)
+                result_db.close()
+            self.result_signal.emit(format_summary(total_files, store, notes), store)
         except Exception as e:
             self.error_signal.emit(f"处理过程中出错: {str(e)}")
         finally:
@@ -125,30 +1773,171 @@ class WorkerThread(QThread):
 
     def stop(self):
         self.is_running = False
+        if self.coordinator is not None:
+            self.coordinator.stop()
+
+    def scan_local(self):
+        # 在本机逐个扫描，内容相同的文件只扫描一次；产出 (文件路径, (报告正文, 结果行) 或 None)
+        total_files = len(self.files)
+        content_keys, scanned, remaining = {}, {}, Counter()
+        if self.config.get("dedup_files", True):
+            content_keys = file_fingerprints(self.files)
+            remaining.update(content_keys.values())
+        for i, file_path in enumerate(self.files):
+            if not self.is_running:
+                break
+            self.progress_signal.emit(i + 1, total_files, os.path.basename(file_path))
+            try:
+                content_key = content_keys.get(file_path)
+                if content_key is not None and content_key in scanned:
+                    # 相同内容已扫描过，直接复用结果并改写路径
+                    cached = scanned[content_key]
+                    remaining[content_key] -= 1
+                    if remaining[content_key] == 0:
+                        del scanned[content_key]
+                    self.duplicate_files += 1
+                    scan = None if cached is None else retarget_results(cached[0], cached[1], file_path)
+                else:
+                    scan = self.scan_file(file_path)
+                    if content_key is not None:
+                        remaining[content_key] -= 1
+                        if remaining[content_key] > 0:
+                            scanned[content_key] = scan
+            except Exception as e:
+                self.error_signal.emit(f"读取文件 {file_path} 时出错: {str(e)}")
+                continue
+            yield file_path, scan
+
+    def scan_remote(self, nodes):
+        # 作为协调端把文件分发给扫描节点，按完成顺序产出结果；文件路径需在节点上可读。
+        # 内容相同的文件只分发第一个（协调端读不到的文件不参与去重），其余等它的结果回来后改写路径
+        total_files = len(self.files)
+        submitted, followers = dedup_plan(self.files, self.config.get("dedup_files", True))
+        self.coordinator = ScanCoordinator(nodes, self.config, submitted)
+        done = 0
+        try:
+            for file_path, scan, error, overruns in self.coordinator.scan():
+                done += 1
+                self.progress_signal.emit(done, total_files, os.path.basename(file_path))
+                self.overruns.extend(overruns)
+                if error:
+                    self.error_signal.emit(error)
+                    scan = None
+                else:
+                    yield file_path, scan
+                for duplicate in followers.pop(file_path, []):
+                    done += 1
+                    self.duplicate_files += 1
+                    self.progress_signal.emit(done, total_files, os.path.basename(duplicate))
+                    if scan is not None:
+                        yield duplicate, retarget_results(scan[0], scan[1], duplicate)
+            self.node_notes = [f"由 {len(self.coordinator.loads)}/{len(nodes)} 个扫描节点分布式处理"]
+            self.node_notes.extend(f"  {node} 已停用: {reason}" for node, reason in self.coordinator.lost.items())
+            self.balance = format_balance(self.coordinator.units, self.coordinator.loads)
+        finally:
+            self.coordinator = None
+
+    def scan_parallel(self, processes):
+        # 本机多进程扫描：文件先 stat 后按大小打包成工作单元，大的先派发；
+        # 内容相同的文件只提交第一个，其余等它的结果回来后改写路径
+        total_files = len(self.files)
+        submitted, followers = dedup_plan(self.files, self.config.get("dedup_files", True))
+        units = plan_work_units(submitted)
+        loads = {}
+        done = 0
+        futures, taken = {}, set()
+        try:
+            # 在 Qt 进程的工作线程里 fork 不安全，子进程一律用 spawn 启动
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = {pool.submit(scan_work_unit, self.config, files): (size, files) for size, files in units}
+                try:
+                    for future in as_completed(futures):
+                        if not self.is_running:
+                            break
+                        taken.add(future)
+                        size, files = futures[future]
+                        try:
+                            pid, seconds, unit_reports, block = future.result()
+                            batch = HitBatch.from_shared_memory(*block) if block else None
+                            reports = [
+                                (file_path, None if text is None else (text, batch.slice(start, end) if batch else []),
+                                 error, overruns)
+                                for file_path, text, start, end, error, overruns in unit_reports
+                            ]
+                        except Exception as e:
+                            reports = [(file_path, None, f"读取文件 {file_path} 时出错: {str(e)}", []) for file_path in files]
+                        else:
+                            load = loads.setdefault(f"进程 {pid}", [0, 0, 0.0])
+                            load[0] += len(files)
+                            load[1] += size
+                            load[2] += seconds
+                        for file_path, scan, error, overruns in reports:
+                            done += 1
+                            self.progress_signal.emit(done, total_files, os.path.basename(file_path))
+                            self.overruns.extend(overruns)
+                            if error:
+                                self.error_signal.emit(error)
+                                scan = None
+                            else:
+                                yield file_path, scan
+                            for duplicate in followers.pop(file_path, []):
+                                done += 1
+                                self.duplicate_files += 1
+                                self.progress_signal.emit(done, total_files, os.path.basename(duplicate))
+                                if scan is not None:
+                                    yield duplicate, retarget_results(scan[0], scan[1], duplicate)
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            # 停止或出错后，退出进程池时仍会跑完已开始的单元；它们的共享内存块已脱离子进程的资源跟踪，需在这里删除
+            for future in futures:
+                if future not in taken and future.done() and not future.cancelled() and future.exception() is None:
+                    block = future.result()[3]
+                    if block:
+                        HitBatch.discard_shared_memory(block[0])
+        self.balance = format_balance(units, loads)
+
+    def scan_file(self, file_path):
+        # 返回 (报告正文, 结果行)，二进制或无法读取的文件返回 None
+        if self.config.get("structured_tables", False) and \
+                os.path.splitext(file_path)[1].lower() in TABLE_DELIMITERS:
+            return self.process_table(file_path, self.config)
+        content = self.read_file_optimized(file_path)
+        if content is None:
+            return None
+        return self.process_text(content, self.config, file_path)
+
+    def compile_rules(self, config):
+        if self.rule_cache is None or self.rule_cache[0] is not config:
+            self.rule_cache = (config, compile_rules(config))
+        return self.rule_cache[1]
 
-    def detect_encoding(self, file_path):
+    def detect_encoding(self, file_path, raw_data=None):
         # 先检查缓存
         if file_path in self.encoding_cache:
             return self.encoding_cache[file_path]
         
-        # 小文件快速检测
+        # 小文件快速检测；调用方已读出文件开头时直接用，不再打开文件
         try:
-            with open(file_path, 'rb') as f:
-                raw_data = f.read(10240)  # 读取前10KB检测
-                if not raw_data.strip():
-                    return 'utf-8'
-                
-                result = chardet.detect(raw_data)
-                encoding = result['encoding'] or 'utf-8'
-                encoding = encoding.lower().replace('utf-16le', 'utf-16').replace('utf-16be', 'utf-16')
-                
-                # 验证编码是否有效
-                try:
-                    raw_data.decode(encoding)
-                    self.encoding_cache[file_path] = encoding
-                    return encoding
-                except UnicodeDecodeError:
-                    pass
+            if raw_data is None:
+                with open(file_path, 'rb') as f:
+                    raw_data = f.read(10240)  # 读取前10KB检测
+            raw_data = raw_data[:10240]
+            if not raw_data.strip():
+                return 'utf-8'
+
+            result = chardet.detect(raw_data)
+            encoding = result['encoding'] or 'utf-8'
+            encoding = encoding.lower().replace('utf-16le', 'utf-16').replace('utf-16be', 'utf-16')
+
+            # 验证编码是否有效
+            try:
+                raw_data.decode(encoding)
+                self.encoding_cache[file_path] = encoding
+                return encoding
+            except UnicodeDecodeError:
+                pass
             
             # 如果快速检测失败，尝试常见编码
             for enc in ['utf-8', 'gbk', 'gb18030', 'big5', 'utf-16']:
@@ -166,26 +1955,37 @@ class WorkerThread(QThread):
             return 'utf-8'
 
     def read_file_optimized(self, file_path):
+        # 整个读取过程只打开一次文件：开头 10KB 同时用于二进制过滤和编码检测
         try:
-            # 1. 二进制头过滤
             with open(file_path, 'rb') as f:
-                head = f.read(1024)
-                if b'\x00' in head:
+                head = f.read(10240)
+                # 1. 二进制头过滤
+                if b'\x00' in head[:1024]:
                     return None
-            
-            # 2. 获取文件编码
-            if self.auto_detect_encoding:
-                encoding = self.detect_encoding(file_path)
-            else:
-                encoding = 'utf-8'
-            
-            # 3. 高效读取大文件
-            file_size = os.path.getsize(file_path)
-            if file_size > 10 * 1024 * 1024:  # 大于10MB的文件
-                chunks = []
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(self.chunk_size)
+
+                # 2. 获取文件编码
+                if self.auto_detect_encoding:
+                    encoding = self.detect_encoding(file_path, head)
+                else:
+                    encoding = 'utf-8'
+
+                # 3. 高效读取大文件，超出单文件大小预算时只读前面部分
+                file_size = os.fstat(f.fileno()).st_size
+                size_budget = int(self.config.get("file_size_budget_mb", 0) * 1024 * 1024)
+                if size_budget and file_size > size_budget:
+                    self.overruns.append((file_path, f"超出大小预算，仅扫描前 {size_budget // (1024 * 1024)} MB"))
+                    file_size = size_budget
+                if file_size <= len(head):
+                    data = head[:file_size]
+                else:
+                    f.seek(0)
+                    data = None if file_size > 10 * 1024 * 1024 else f.read(file_size)
+                if data is None:  # 大于10MB的文件分块解码
+                    chunks = []
+                    left = file_size
+                    while left > 0:
+                        chunk = f.read(min(self.chunk_size, left))
+                        left -= len(chunk)
                         if not chunk:
                             break
                         try:
@@ -195,144 +1995,257 @@ class WorkerThread(QThread):
                                 chunks.append(chunk.decode('utf-8', errors='ignore'))
                             except Exception:
                                 chunks.append(chunk.decode('gbk', errors='ignore'))
-                return ''.join(chunks)
-            else:
-                # 小文件一次性读取
-                with open(file_path, 'rb') as f:
-                    data = f.read()
+                    return ''.join(chunks)
+            # 小文件一次性读取
+            try:
+                return data.decode(encoding, errors='ignore')
+            except Exception:
                 try:
-                    return data.decode(encoding, errors='ignore')
+                    return data.decode('utf-8', errors='ignore')
                 except Exception:
-                    try:
-                        return data.decode('utf-8', errors='ignore')
-                    except Exception:
-                        return data.decode('gbk', errors='ignore')
+                    return data.decode('gbk', errors='ignore')
         except Exception as e:
             self.error_signal.emit(f"读取文件 {file_path} 时出错: {str(e)}")
             return None
 
+    @staticmethod
+    def nearby_chars(line, matches, width):
+        # 每个匹配前后各 width 个字符，匹配本身用 [..] 标出，重复片段只保留一次
+        parts = []
+        for match in matches:
+            start = match.start()
+            end = match.end()
+            parts.append(f"{line[max(0, start - width):start]}[{line[start:end]}]{line[end:end + width]}")
+        return "\n".join(dict.fromkeys(parts))
+
     def process_text(self, text, config, file_path):
-        keywords = config["keywords"]
-        nearby_lines = config["nearby_lines"]
-        nearby_chars = config["nearby_chars"]
+        rules = self.compile_rules(config)
         results = []
         result_lines = []
         total_hits = 0
-        lines = text.splitlines()
+        index = LineIndex(text, config.get("long_line_chars", LONG_LINE_CHARS))
+        line_count = len(index)
+        # 单文件时间预算：每检查一批候选行看一次时钟，超时后放弃本文件剩余扫描
+        time_budget = config.get("file_time_budget", 0)
+        deadline = time.monotonic() + time_budget if time_budget else 0
+        timed_out = False
+        steps = 0
+        output_mode = config.get("output_mode", "full")
+        # 仅计数 / 仅列文件模式不生成上下文和报告正文
+        summary_only = output_mode in ("count", "files")
+        merge = config.get("context_merge", False) and not summary_only
+        positions = WordPositions(index)
+        # 各归一方式下的文本只生成一次，与原文共用行索引；匹配在归一文本上做，上下文从原文取
+        views = {}
 
         # 添加文件信息头
         result_lines.append(f"文件路径: {file_path}")
         result_lines.append(f"文件名: {os.path.basename(file_path)}")
         result_lines.append("-" * 50)
 
-        for kw in keywords:
-            words = kw.get("words", [])
-            exclude = kw.get("exclude", [])
-            kw_lines = kw.get("nearby_lines", nearby_lines)
-            kw_chars = kw.get("nearby_chars", nearby_chars)
-            down_lines = kw.get("down_lines", 0)
-            up_lines = kw.get("up_lines", 0)
-            exclude_nearby = kw.get("exclude_nearby", True)
-            multi_line_exclude = kw.get("multi_line_exclude", False)
-
-            for line_no, line in enumerate(lines, 1):
-                if not words:
-                    continue
-
-                # 准备附近内容
-                start_line = max(0, line_no - 1 - kw_lines)
-                end_line = min(len(lines), line_no + kw_lines)
-                nearby_lines_text = "\n".join(lines[start_line:end_line])
-
-                # 准备向下内容
-                down_text = ""
+        for rule in rules:
+            if deadline and time.monotonic() > deadline:
+                timed_out = True
+                break
+            words = rule.words
+            exclude = rule.exclude
+            kw_lines = rule.nearby_lines
+            kw_chars = rule.nearby_chars
+            down_lines = rule.down_lines
+            up_lines = rule.up_lines
+            exclude_nearby = rule.exclude_nearby
+            multi_line_exclude = rule.multi_line_exclude
+
+            block_context = rule.block_context
+            # 默认模式下关键字需出现在附近文字中，附近字符数为 0 时不可能命中
+            if not words or (not multi_line_exclude and not block_context and kw_chars <= 0):
+                continue
+            if rule.fold is None:
+                scan, scan_positions = index, positions
+            else:
+                if rule.fold not in views:
+                    folded = index.with_text(fold_text(text, *rule.fold))
+                    views[rule.fold] = (folded, WordPositions(folded))
+                scan, scan_positions = views[rule.fold]
+            # 整个文件都不含首个关键字（或正则必需字面量）时直接跳过
+            if not rule.may_match(scan.text):
+                continue
+
+            positional = rule.positional and not index.exotic
+            prechecked = False
+            # 超长行分段时，多行 / 配置块范围要带上分段两侧的重叠部分，逐行按偏移区间判断
+            spanned = scan.segmented and (multi_line_exclude or block_context)
+            candidate_lines = rule.candidate_lines(scan)
+            if positional and len(words) > 1 and np is not None and not spanned:
+                candidate_lines = scan_positions.filter_lines(rule, candidate_lines)
+                prechecked = True
+            merged_hits = []
+            excluded_lines = []
+            # 每个文件每条规则的命中上限：仅列文件模式命中一次即可结束本规则
+            rule_limit = 1 if output_mode == "files" else rule.max_hits
+            rule_hits = 0
+            first_hit_line = 0
+            for line_idx in candidate_lines:
+                if rule_limit and rule_hits >= rule_limit:
+                    break
+                steps += 1
+                if deadline and not steps & 255 and time.monotonic() > deadline:
+                    timed_out = True
+                    break
+                if scan.segmented:
+                    # 分段两侧带上重叠部分，只认起点落在本分段内的匹配，跨越切点的关键字既不丢也不重复
+                    line_start, line_end = scan.extent(line_idx, rule.reach + kw_chars)
+                    line = scan.text[line_start:line_end]
+                    own_start = int(scan.starts[line_idx]) - line_start
+                    own_end = int(scan.ends[line_idx]) - line_start
+                    matches = [m for m in rule.anchor.finditer(line, own_start) if m.start() < own_end] \
+                        if rule.may_match(line) else []
+                    if not matches:
+                        continue
+                    if kw_chars <= 0:
+                        matches = []
+                else:
+                    line = scan.line(line_idx)
+                    if not rule.candidate(line):
+                        continue
+                    line_start = int(scan.starts[line_idx])
+                    line_end = line_start + len(line)
+                    matches = list(rule.anchor.finditer(line)) if kw_chars > 0 else []
+                line_no = line_idx + 1
+
+                # 附近、向下、向上内容的行范围（从 0 开始，左闭右开）
+                if block_context:
+                    start_line, end_line = positions.blocks.block_of(line_idx)
+                else:
+                    start_line = max(0, line_no - 1 - kw_lines)
+                    end_line = min(line_count, line_no + kw_lines)
+                ranges = [(start_line, end_line)]
                 if down_lines != 0:
                     if down_lines > 0:
                         down_start = line_no
-                        down_end = min(len(lines), line_no + down_lines)
+                        down_end = min(line_count, line_no + down_lines)
                     else:
                         down_start = max(0, line_no + down_lines - 1)
                         down_end = line_no
-                    down_text = "\n".join(lines[down_start:down_end])
-
-                # 准备向上内容
-                up_text = ""
+                    ranges.append((down_start, down_end))
                 if up_lines != 0:
                     if up_lines > 0:
                         up_start = max(0, line_no - 1 - up_lines)
                         up_end = line_no - 1
                     else:
                         up_start = line_no - 1
-                        up_end = min(len(lines), line_no - 1 - up_lines)
-                    up_text = "\n".join(lines[up_start:up_end])
+                        up_end = min(line_count, line_no - 1 - up_lines)
+                    ranges.append((up_start, up_end))
+
+                # 分段时各行范围对应的偏移区间，两侧各延伸最长关键字的长度，跨越切点的关键字不会漏掉
+                spans = [(scan.extent(a, rule.reach)[0], scan.extent(b - 1, rule.reach)[1])
+                         for a, b in ranges if a < b] if scan.segmented else None
+
+                # 位置引擎：直接用各关键字的出现位置判断邻近条件，不满足的行不生成任何上下文文本
+                if positional and len(words) > 1 and spanned:
+                    if not all(scan_positions.in_spans(word, spans[:1] if block_context else spans)
+                               for word in words[1:]):
+                        continue
+                elif positional and len(words) > 1 and not prechecked:
+                    if block_context:
+                        if not all(scan_positions.in_line_ranges(word, ranges[:1]) for word in words[1:]):
+                            continue
+                    elif multi_line_exclude:
+                        if not all(scan_positions.in_line_ranges(word, ranges) for word in words[1:]):
+                            continue
+                    else:
+                        if not matches:
+                            continue
+                        anchors = [(line_start + m.start(), line_start + m.end()) for m in matches]
+                        if not all(word in words[0] or scan_positions.near_anchors(word, anchors, kw_chars, line_start, line_end)
+                                   for word in words[1:]):
+                            continue
+
+                if summary_only and positional and not exclude:
+                    rule_hits += 1
+                    first_hit_line = first_hit_line or index.line_no(line_idx)
+                    continue
 
-                # 准备附近字符内容
-                nearby_chars_text = ""
-                if kw_chars > 0:
-                    pattern = re.compile(r'(' + '|'.join(re.escape(word) for word in words[0:1]) + ')')
-                    matches = list(pattern.finditer(line))
-                    if matches:
-                        parts = []
-                        for match in matches:
-                            start = match.start()
-                            end = match.end()
-                            pre_start = max(0, start - kw_chars)
-                            pre_end = start
-                            post_start = end
-                            post_end = min(len(line), end + kw_chars)
-                            pre_part = line[pre_start:pre_end]
-                            post_part = line[post_start:post_end]
-                            parts.append(f"{pre_part}[{match.group()}]{post_part}")
-                        seen = set()
-                        unique_parts = []
-                        for part in parts:
-                            if part not in seen:
-                                seen.add(part)
-                                unique_parts.append(part)
-                        nearby_chars_text = "\n".join(unique_parts)
-
-                # 检查匹配
-                match_success = False
-                if multi_line_exclude:
-                    if any(w in line for w in words[0:1]):
-                        other_keywords = words[1:]
-                        if other_keywords:
-                            combined_content = (
-                                nearby_lines_text + "\n" +
-                                nearby_chars_text + "\n" +
-                                down_text + "\n" +
-                                up_text
-                            )
-                            all_found = all(word in combined_content for word in other_keywords)
-                            if all_found:
-                                match_success = True
+                # 准备附近内容和附近字符内容
+                nearby_lines_text = scan.window(start_line, end_line)
+                down_text = scan.window(down_start, down_end) if down_lines != 0 else ""
+                up_text = scan.window(up_start, up_end) if up_lines != 0 else ""
+                nearby_chars_text = self.nearby_chars(line, matches, kw_chars)
+                # 分段时关键字和排除文本在带重叠的区间文本中检查，报告仍显示分段本身
+                span_texts = [scan.text[lo:hi] for lo, hi in spans] if spans else None
+
+                # 检查匹配（正则等无法用位置引擎的规则）
+                if not positional:
+                    if block_context:
+                        block_text = span_texts[0] if span_texts else nearby_lines_text
+                        if not all(rule.contains(i, block_text) for i in range(1, len(words))):
+                            continue
+                    elif multi_line_exclude:
+                        if len(words) > 1:
+                            if span_texts:
+                                combined_content = "\n".join(span_texts + [nearby_chars_text])
                             else:
+                                combined_content = (
+                                    nearby_lines_text + "\n" +
+                                    nearby_chars_text + "\n" +
+                                    down_text + "\n" +
+                                    up_text
+                                )
+                            if not all(rule.contains(i, combined_content) for i in range(1, len(words))):
                                 continue
-                        else:
-                            match_success = True
-                else:
-                    all_found = all(word in nearby_chars_text for word in words)
-                    if all_found:
-                        match_success = True
-
-                if not match_success:
-                    continue
+                    else:
+                        # 首个关键字已体现在附近文字的 [..] 中，只需检查其余关键字
+                        all_found = all(rule.contains(i, nearby_chars_text) for i in range(1, len(words)))
+                        if not (nearby_chars_text and all_found):
+                            continue
 
                 # 检查排除文本
                 combined_text = line
-                if exclude_nearby:
+                if exclude_nearby and span_texts:
+                    combined_text += "".join(span_texts) + nearby_chars_text
+                elif exclude_nearby:
                     combined_text += nearby_lines_text + nearby_chars_text + down_text + up_text
 
                 excluded = any(e and e in combined_text for e in exclude)
+                if summary_only:
+                    if not excluded:
+                        rule_hits += 1
+                        first_hit_line = first_hit_line or index.line_no(line_idx)
+                    continue
+                if excluded and merge:
+                    excluded_lines.append(line_no)
+                    continue
                 if excluded:
-                    result_lines.append(f"已排除（包含排除文本）: {' + '.join(words)}（位于第 {line_no} 行）")
+                    result_lines.append(f"已排除（包含排除文本）: {rule.label}（位于{index.describe(line_idx)}）")
                     result_lines.append("-" * 50)
                     continue
+                if scan is not index:
+                    # 按相同偏移从原文重新取上下文，报告中显示文件原样
+                    nearby_lines_text = index.window(start_line, end_line)
+                    down_text = index.window(down_start, down_end) if down_lines != 0 else ""
+                    up_text = index.window(up_start, up_end) if up_lines != 0 else ""
+                    nearby_chars_text = self.nearby_chars(text[line_start:line_end], matches, kw_chars)
 
                 # 记录匹配结果
                 total_hits += 1
-                result_lines.append(f"关键字列表: {' + '.join(words)}（位于第 {line_no} 行）")
-                result_lines.append("附近行内容:")
+                rule_hits += 1
+                if merge:
+                    # 合并模式下先收集命中行及其上下文范围，本规则扫描完再统一输出
+                    span = [(start_line, end_line)]
+                    if down_lines != 0:
+                        span.append((down_start, down_end))
+                    if up_lines != 0:
+                        span.append((up_start, up_end))
+                    span = [(a, b) for a, b in span if a < b]
+                    merged_hits.append((
+                        line_no,
+                        min(a for a, _ in span),
+                        max(b for _, b in span),
+                        nearby_chars_text
+                    ))
+                    continue
+                result_lines.append(f"关键字列表: {rule.label}（位于{index.describe(line_idx)}）")
+                result_lines.append("所在配置块:" if block_context else "附近行内容:")
                 result_lines.append(nearby_lines_text)
                 if kw_chars > 0:
                     result_lines.append("附近文字:")
@@ -349,16 +2262,41 @@ class WorkerThread(QThread):
 
                 # 保存结果数据
                 results.append({
-                    "keywords": " + ".join(words),
-                    "line_number": line_no,
+                    "keywords": rule.label,
+                    "line_number": index.line_no(line_idx),
                     "nearby_lines": nearby_lines_text,
                     "nearby_chars": nearby_chars_text,
                     "down_lines": down_text,
                     "up_lines": up_text,
                     "source": os.path.basename(file_path),
                     "file_path": file_path,
-                    "exclude_text": "; ".join(exclude)
+                    "exclude_text": rule.exclude_text
+                })
+
+            if merge:
+                self.format_merged_hits(rule, index, merged_hits, excluded_lines, file_path,
+                                        result_lines, results)
+            if summary_only and rule_hits:
+                total_hits += rule_hits
+                if output_mode == "count":
+                    result_lines.append(f"关键字列表: {rule.label}（命中 {rule_hits} 次，首次位于第 {first_hit_line} 行）")
+                else:
+                    result_lines.append(f"关键字列表: {rule.label}（首次位于第 {first_hit_line} 行）")
+                row = {field: "" for field in RESULT_FIELDS}
+                row.update({
+                    "keywords": rule.label,
+                    "line_number": first_hit_line,
+                    "source": os.path.basename(file_path),
+                    "file_path": file_path,
+                    "exclude_text": rule.exclude_text
                 })
+                if output_mode == "count":
+                    row["hit_count"] = rule_hits
+                results.append(row)
+
+        if timed_out:
+            self.overruns.append((file_path, f"超出时间预算 {time_budget} 秒，部分规则未扫描完"))
+            result_lines.append(f"扫描超出单文件时间预算（{time_budget} 秒），本文件结果不完整")
 
         # 插入匹配统计信息
         header = f"匹配到 {total_hits} 个关键字列表"
@@ -366,6 +2304,855 @@ class WorkerThread(QThread):
         result_text = "\n".join(result_lines)
         return result_text, results
 
+    def process_table(self, file_path, config):
+        # CSV/TSV 按列流式检索：逐条记录解析，每行先取出规则用到的列（每种归一方式只归一一次），
+        # 每条规则再拼接它限定的列；没有规则检索整行时不保留原始行文本。行号为数据行序号（不含表头）
+        with open(file_path, 'rb') as f:
+            if b'\x00' in f.read(1024):
+                return None
+        encoding = self.detect_encoding(file_path) if self.auto_detect_encoding else 'utf-8'
+        rules = [rule for rule in self.compile_rules(config) if rule.words]
+        output_mode = config.get("output_mode", "full")
+        summary_only = output_mode in ("count", "files")
+        results = []
+        result_lines = [f"文件路径: {file_path}", f"文件名: {os.path.basename(file_path)}", "-" * 50]
+        total_hits = 0
+        # 超出单文件大小预算时只解析前面部分，与文本文件一致
+        size_budget = int(config.get("file_size_budget_mb", 0) * 1024 * 1024)
+        if size_budget and os.path.getsize(file_path) > size_budget:
+            self.overruns.append((file_path, f"超出大小预算，仅扫描前 {size_budget // (1024 * 1024)} MB"))
+        else:
+            size_budget = 0
+
+        with open_table(file_path, encoding, size_budget) as f:
+            delimiter = table_delimiter(file_path, f.read(8192))
+            f.seek(0)
+            keep_text = any(not rule.columns for rule in rules)
+            rows = iter_table_rows(f, delimiter, keep_text)
+            header = next(rows, (None, []))[1]
+            header = [name.strip().lstrip('\ufeff') for name in header]
+            positions = {name: i for i, name in reversed(list(enumerate(header)))}
+            # 每条规则查找的列在取出列表中的位置；指定的列在表头中都不存在时本文件跳过该规则
+            targets, needed = [], {}
+            for rule in rules:
+                if rule.columns:
+                    columns = [(name, needed.setdefault(positions[name], len(needed)))
+                               for name in rule.columns if name in positions]
+                    if not columns:
+                        continue
+                else:
+                    columns = None
+                # 关键字含引号时原始行中的引号是转义过的，不能用原始行预筛
+                quick = keep_text and not any('"' in word for word in rule.words)
+                targets.append([rule, columns, quick, 0, 0])
+            needed = list(needed)
+            width = max(needed, default=-1) + 1
+
+            time_budget = config.get("file_time_budget", 0)
+            deadline = time.monotonic() + time_budget if time_budget else 0
+            # 每条规则都有命中上限（或为仅列文件模式）时，全部达到上限即停止解析本文件
+            limits = [1 if output_mode == "files" else target[0].max_hits for target in targets]
+            capped = all(limits)
+            for row_no, (row_text, fields) in enumerate(rows, 1):
+                if not self.is_running:
+                    break
+                if capped and all(target[3] >= limit for target, limit in zip(targets, limits)):
+                    break
+                if deadline and not row_no & 255 and time.monotonic() > deadline:
+                    self.overruns.append((file_path, f"超出时间预算 {time_budget} 秒，仅扫描前 {row_no - 1} 行数据"))
+                    result_lines.append(f"扫描超出单文件时间预算（{time_budget} 秒），本文件结果不完整")
+                    break
+                if len(fields) < width:
+                    fields = fields + [""] * (width - len(fields))
+                values = [fields[i] for i in needed]
+                # 每种归一方式下本行（和取出的列）只归一一次，供各规则共用
+                folded_rows, folded_values = {}, {}
+                for target in targets:
+                    rule, columns, quick, rule_hits, first_hit_line = target
+                    rule_limit = 1 if output_mode == "files" else rule.max_hits
+                    if rule_limit and rule_hits >= rule_limit:
+                        continue
+                    scan_text = row_text
+                    if rule.fold is not None and row_text is not None:
+                        if rule.fold not in folded_rows:
+                            folded_rows[rule.fold] = fold_text(row_text, *rule.fold)
+                        scan_text = folded_rows[rule.fold]
+                    # 原始行都不含首个关键字时不必取列
+                    if quick and not rule.may_match(scan_text):
+                        continue
+                    if columns is None:
+                        selected = [("", row_text)]
+                        haystack = scan_text
+                    else:
+                        selected = [(name, values[i]) for name, i in columns]
+                        scan_values = values
+                        if rule.fold is not None:
+                            if rule.fold not in folded_values:
+                                folded_values[rule.fold] = [fold_text(value, *rule.fold) for value in values]
+                            scan_values = folded_values[rule.fold]
+                        haystack = "\n".join(scan_values[i] for _, i in columns)
+                    if not all(rule.contains(i, haystack) for i in range(len(rule.words))):
+                        continue
+                    excluded = any(e and e in haystack for e in rule.exclude)
+                    if excluded and not summary_only:
+                        result_lines.append(f"已排除（包含排除文本）: {rule.label}（位于第 {row_no} 行数据）")
+                        result_lines.append("-" * 50)
+                    if excluded:
+                        continue
+                    target[3] += 1
+                    target[4] = first_hit_line or row_no
+                    if summary_only:
+                        continue
+                    total_hits += 1
+                    field_text = row_text if columns is None else "\n".join(f"{name}: {value}" for name, value in selected)
+                    result_lines.append(f"关键字列表: {rule.label}（位于第 {row_no} 行数据）")
+                    result_lines.append("列内容:")
+                    result_lines.append(field_text)
+                    result_lines.append("-" * 50)
+                    row = {field: "" for field in RESULT_FIELDS}
+                    row.update({
+                        "keywords": rule.label,
+                        "line_number": row_no,
+                        "nearby_lines": field_text,
+                        "source": os.path.basename(file_path),
+                        "file_path": file_path,
+                        "exclude_text": rule.exclude_text
+                    })
+                    results.append(row)
+
+        if summary_only:
+            for rule, _, _, rule_hits, first_hit_line in targets:
+                if not rule_hits:
+                    continue
+                total_hits += rule_hits
+                if output_mode == "count":
+                    result_lines.append(f"关键字列表: {rule.label}（命中 {rule_hits} 次，首次位于第 {first_hit_line} 行数据）")
+                else:
+                    result_lines.append(f"关键字列表: {rule.label}（首次位于第 {first_hit_line} 行数据）")
+                row = {field: "" for field in RESULT_FIELDS}
+                row.update({
+                    "keywords": rule.label,
+                    "line_number": first_hit_line,
+                    "source": os.path.basename(file_path),
+                    "file_path": file_path,
+                    "exclude_text": rule.exclude_text
+                })
+                if output_mode == "count":
+                    row["hit_count"] = rule_hits
+                results.append(row)
+
+        result_lines.insert(3, f"匹配到 {total_hits} 个关键字列表")
+        return "\n".join(result_lines), results
+
+    def format_merged_hits(self, rule, index, hits, excluded_lines, file_path, result_lines, results):
+        # 类似 grep -C：上下文范围重叠或相邻的命中合并为一组，命中行以 ":" 标记，上下文行以 "-" 标记
+        groups = []
+        for line_no, start, end, chars_text in hits:
+            if groups and start <= groups[-1]["end"]:
+                group = groups[-1]
+                group["end"] = max(group["end"], end)
+            else:
+                group = {"start": start, "end": end, "lines": [], "chars": {}}
+                groups.append(group)
+            group["lines"].append(line_no)
+            if chars_text:
+                group["chars"].setdefault(chars_text, None)
+
+        for group in groups:
+            hit_lines = set(group["lines"])
+            block = index.window(group["start"], group["end"])
+            if index.segmented:
+                # 超长行的每个分段单独一行，标实际行号
+                numbered = [
+                    f"{index.line_no(n)}{':' if n + 1 in hit_lines else '-'} {index.line(n)}"
+                    for n in range(group["start"], group["end"])
+                ]
+            else:
+                numbered = [
+                    f"{n}{':' if n in hit_lines else '-'} {text}"
+                    for n, text in enumerate(block.split("\n"), group["start"] + 1)
+                ]
+            group["lines"] = list(dict.fromkeys(index.line_no(n - 1) for n in group["lines"]))
+            line_list = "、".join(str(n) for n in group["lines"])
+            chars_text = "\n".join(group["chars"])
+            result_lines.append(f"关键字列表: {rule.label}（位于第 {line_list} 行）")
+            result_lines.append(
+                f"上下文（第 {index.line_no(group['start'])}-{index.line_no(group['end'] - 1)} 行）:"
+            )
+            result_lines.extend(numbered)
+            if chars_text:
+                result_lines.append("附近文字:")
+                result_lines.append(chars_text)
+            result_lines.append("-" * 50)
+            results.append({
+                "keywords": rule.label,
+                "line_number": group["lines"][0],
+                "nearby_lines": block,
+                "nearby_chars": chars_text,
+                "down_lines": "",
+                "up_lines": "",
+                "source": os.path.basename(file_path),
+                "file_path": file_path,
+                "exclude_text": rule.exclude_text,
+                "hit_lines": ", ".join(str(n) for n in group["lines"])
+            })
+
+        for line_no in excluded_lines:
+            result_lines.append(f"已排除（包含排除文本）: {rule.label}（位于{index.describe(line_no - 1)}）")
+            result_lines.append("-" * 50)
+
+# -------------------- 调度 --------------------
+# 小文件按原顺序打包成工作单元，单元达到该大小或文件数即封口；超过该大小的文件单独成一个单元
+WORK_UNIT_BYTES = 8 * 1024 * 1024
+WORK_UNIT_FILES = 256
+
+
+def plan_work_units(files, unit_bytes=WORK_UNIT_BYTES, unit_files=WORK_UNIT_FILES):
+    # 先统一 stat 所有文件，返回按总大小从大到小排列的工作单元 [(总字节数, [文件, ...]), ...]，
+    # 最大的先派发，避免一个大文件排在末尾拖长整批耗时
+    units = []
+    batch, batch_bytes = [], 0
+    for file_path in files:
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = 0
+        if size >= unit_bytes:
+            units.append((size, [file_path]))
+            continue
+        batch.append(file_path)
+        batch_bytes += size
+        if batch_bytes >= unit_bytes or len(batch) >= unit_files:
+            units.append((batch_bytes, batch))
+            batch, batch_bytes = [], 0
+    if batch:
+        units.append((batch_bytes, batch))
+    units.sort(key=lambda unit: unit[0], reverse=True)
+    return units
+
+
+def format_balance(units, loads):
+    # loads: 执行者 -> [文件数, 字节数, 忙碌秒数]
+    if not loads:
+        return []
+    lines = [f"调度: {len(units)} 个工作单元，{len(loads)} 个执行者"]
+    for name, (files, size, seconds) in sorted(loads.items()):
+        lines.append(f"  {name}: {files} 个文件 / {size / (1024 * 1024):.1f} MB / {seconds:.1f} 秒")
+    longest = max(seconds for _, _, seconds in loads.values())
+    if longest > 0:
+        average = sum(seconds for _, _, seconds in loads.values()) / len(loads)
+        lines.append(f"  负载均衡度（平均/最长耗时）: {average / longest:.0%}")
+    return lines
+
+
+def scan_reports(engine, files, errors):
+    # 逐个扫描文件，产出 (文件, (报告正文, 结果行) 或 None, 错误信息, 预算超限列表)；
+    # errors 为已连接到 engine.error_signal 的列表
+    for file_path in files:
+        errors.clear()
+        engine.overruns = []
+        try:
+            scan = engine.scan_file(file_path)
+        except Exception as e:
+            errors.append(f"读取文件 {file_path} 时出错: {str(e)}")
+            scan = None
+        yield file_path, scan, errors[-1] if errors else None, engine.overruns
+
+
+_unit_engine = None
+_unit_errors = []
+
+
+def scan_work_unit(config, files):
+    # 进程池中执行一个工作单元；同一进程内配置不变时复用引擎，规则只编译一次、编码缓存持续有效
+    global _unit_engine
+    if _unit_engine is None or _unit_engine.config != config:
+        _unit_engine = WorkerThread(config, [], config.get("auto_detect_encoding", True))
+        _unit_engine.error_signal.connect(_unit_errors.append)
+    started = time.monotonic()
+    # 整个单元的结果行合成一个列式批次放进共享内存，只回传报告正文和各文件在批次中的行范围
+    reports, rows = [], []
+    for file_path, scan, error, overruns in scan_reports(_unit_engine, files, _unit_errors):
+        start = len(rows)
+        if scan is not None:
+            rows.extend(scan[1])
+        reports.append((file_path, scan[0] if scan is not None else None, start, len(rows), error, overruns))
+    block = HitBatch.from_rows(rows).to_shared_memory() if rows else None
+    return os.getpid(), time.monotonic() - started, reports, block
+
+
+# -------------------- 分布式扫描 --------------------
+# 协调端把文件列表切成分片发给各扫描节点，节点按同一套规则扫描后逐个文件回传结果。
+# 协议为 TCP 上逐行 JSON：先发 config（规则及全局选项），再发若干 shard，
+# 节点对分片内每个文件回一条 file / error，最后回 shard_done。文件路径需在节点上可读（共享存储或相同目录结构）。
+# 节点会读取协调端指定的任意路径并回传内容，config 须带上与节点相同的共享口令，且节点只应暴露在可信网络中
+SCAN_PROTOCOL_VERSION = 1
+DEFAULT_WORKER_PORT = 8765
+WORKER_TOKEN_ENV = "CONGSEC_WORKER_TOKEN"  # 未指定 --token 时从该环境变量读取共享口令
+SHARD_SIZE = 16  # 每个分片最多的文件数，小文件再按 WORK_UNIT_BYTES 打包
+NODE_TIMEOUT = 600  # 单个文件在节点上最长等待秒数
+NODE_RETRIES = 2  # 节点连接失败后的重连次数，超过后不再使用该节点
+FILE_ATTEMPTS = 3  # 单个文件最多分发次数
+
+
+class NodeRejected(Exception):
+    # 节点回复 fatal（口令或协议版本不一致），重连也不会成功
+    pass
+
+
+def parse_node(node):
+    host, _, port = node.strip().rpartition(":")
+    if not host:
+        return port, DEFAULT_WORKER_PORT
+    return host, int(port)
+
+
+class ScanRequestHandler(socketserver.StreamRequestHandler):
+    # 每个连接对应一次批量任务，连接内规则只编译一次，编码检测结果也在连接内复用
+    def handle(self):
+        worker = None
+        errors = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            if message["type"] == "config":
+                if message.get("version") != SCAN_PROTOCOL_VERSION:
+                    send_message(self.wfile, {"type": "fatal", "message": "协议版本不一致"})
+                    return
+                token = str(message.get("token", "")).encode("utf-8")
+                if not hmac.compare_digest(token, self.server.token.encode("utf-8")):
+                    send_message(self.wfile, {"type": "fatal", "message": "共享口令不正确"})
+                    return
+                config = message["config"]
+                worker = WorkerThread(config, [], config.get("auto_detect_encoding", True))
+                worker.error_signal.connect(errors.append)
+                worker.compile_rules(config)
+            elif message["type"] == "shard":
+                if worker is None:
+                    send_message(self.wfile, {"type": "fatal", "message": "未收到规则配置"})
+                    return
+                for file_path, scan, error, overruns in scan_reports(worker, message["files"], errors):
+                    if error:
+                        send_message(self.wfile, {"type": "error", "path": file_path, "message": error})
+                        continue
+                    send_message(self.wfile, {
+                        "type": "file",
+                        "path": file_path,
+                        "text": scan[0] if scan else None,
+                        "rows": scan[1] if scan else [],
+                        "overruns": overruns
+                    })
+                send_message(self.wfile, {"type": "shard_done"})
+
+
+class ScanWorkerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, token, host="127.0.0.1", port=DEFAULT_WORKER_PORT):
+        if not token:
+            raise ValueError("扫描节点必须设置共享口令")
+        self.token = token
+        super().__init__((host, port), ScanRequestHandler)
+
+
+class ScanCoordinator:
+    # 各节点一个线程，从共享队列领取分片；节点断开时未回传的文件放回队列由其他节点重试，
+    # 所有节点都不可用或文件多次失败时，该文件以错误结束。scan() 按完成顺序产出每个文件的结果。
+    # 分片按大小从大到小派发；协调端读不到的文件按 0 字节计，退化为按文件数分片
+    def __init__(self, nodes, config, files, shard_size=SHARD_SIZE):
+        self.nodes = [parse_node(node) for node in nodes]
+        # 口令单独发送，不随规则配置下发
+        self.token = config.get("worker_token", "")
+        self.config = public_config(config)
+        self.units = plan_work_units(files, unit_files=shard_size)
+        self.pending = list(reversed(self.units))
+        self.loads = {}  # 节点 -> [文件数, 字节数, 忙碌秒数]
+        self.unfinished = len(files)
+        self.attempts = Counter()
+        self.alive = len(self.nodes)
+        self.lost = {}  # 停用的节点 -> 原因
+        self.lock = threading.Condition()
+        self.results = queue.Queue()
+        self.connections = {}
+        self.active = 0  # 已领取、尚未记下负载的分片数
+        self.stopped = False
+
+    def scan(self):
+        # 产出 (文件路径, (报告正文, 结果行) 或 None, 错误信息, 预算超限列表)
+        threads = [threading.Thread(target=self._drive, args=(node,), daemon=True) for node in self.nodes]
+        for thread in threads:
+            thread.start()
+        received = 0
+        total = self.unfinished
+        while received < total and not self.stopped:
+            try:
+                item = self.results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            received += 1
+            yield item
+        with self.lock:
+            # 最后一个文件回传后节点线程才记下所在分片的负载，等它们记完再读取 loads
+            while self.active and not self.stopped:
+                self.lock.wait(0.5)
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.lock.notify_all()
+            connections = list(self.connections.values())
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _take(self):
+        with self.lock:
+            while not self.stopped:
+                if self.pending:
+                    self.active += 1
+                    return self.pending.pop()
+                if self.unfinished == 0:
+                    return None
+                # 其他节点还有分片在途，等待其完成或失败后放回
+                self.lock.wait(0.5)
+            return None
+
+    def _finish(self, item):
+        with self.lock:
+            self.unfinished -= 1
+            self.lock.notify_all()
+        self.results.put(item)
+
+    def _requeue(self, files, reason):
+        retry = []
+        for file_path in files:
+            self.attempts[file_path] += 1
+            if self.attempts[file_path] >= FILE_ATTEMPTS:
+                self._finish((file_path, None, f"分布式扫描失败（已重试 {FILE_ATTEMPTS} 次）: {reason}", []))
+            else:
+                retry.append(file_path)
+        if retry:
+            with self.lock:
+                self.pending.append((0, retry))
+                self.lock.notify_all()
+
+    def _node_lost(self, node, reason):
+        with self.lock:
+            self.lost[f"{node[0]}:{node[1]}"] = reason
+            self.alive -= 1
+            if self.alive > 0:
+                return
+            orphaned = [file_path for _, shard in self.pending for file_path in shard]
+            self.pending = []
+        for file_path in orphaned:
+            self._finish((file_path, None, f"没有可用的扫描节点: {reason}", []))
+
+    def _connect(self, node):
+        sock = socket.create_connection(node, timeout=NODE_TIMEOUT)
+        stream = sock.makefile("rwb")
+        send_message(stream, {"type": "config", "version": SCAN_PROTOCOL_VERSION,
+                              "token": self.token, "config": self.config})
+        with self.lock:
+            self.connections[node] = sock
+        return sock, stream
+
+    def _drive(self, node):
+        sock = stream = None
+        failures = 0
+        while True:
+            if stream is None:
+                # 先连上节点再领取分片，连不上的节点不占用文件的重试次数
+                try:
+                    sock, stream = self._connect(node)
+                except OSError as e:
+                    failures += 1
+                    if failures > NODE_RETRIES or self.stopped:
+                        self._node_lost(node, str(e))
+                        return
+                    time.sleep(min(2 ** failures, 10) * 0.5)
+                    continue
+            unit = self._take()
+            if unit is None:
+                break
+            shard_bytes, shard = unit
+            done = set()
+            started = time.monotonic()
+            try:
+                send_message(stream, {"type": "shard", "files": shard})
+                while True:
+                    message = read_message(stream)
+                    if message["type"] == "shard_done":
+                        break
+                    if message["type"] == "fatal":
+                        raise NodeRejected(message["message"])
+                    file_path = message["path"]
+                    done.add(file_path)
+                    if message["type"] == "error":
+                        self._finish((file_path, None, message["message"], []))
+                    else:
+                        scan = (message["text"], message["rows"]) if message["text"] is not None else None
+                        self._finish((file_path, scan, None, [tuple(o) for o in message["overruns"]]))
+                failures = 0
+                with self.lock:
+                    load = self.loads.setdefault(f"{node[0]}:{node[1]}", [0, 0, 0.0])
+                    load[0] += len(shard)
+                    load[1] += shard_bytes
+                    load[2] += time.monotonic() - started
+                    self.active -= 1
+                    self.lock.notify_all()
+            except NodeRejected as e:
+                # 节点拒绝本次任务：立即停用，分片原样放回由其他节点扫描，不占用文件的重试次数
+                stream.close()
+                sock.close()
+                with self.lock:
+                    self.active -= 1
+                    self.pending.append((shard_bytes, [file_path for file_path in shard if file_path not in done]))
+                    self.lock.notify_all()
+                self._node_lost(node, str(e))
+                return
+            except (OSError, ValueError) as e:
+                # 分片中途断开：未回传的文件放回队列，同一文件多次导致节点断开时不再重试
+                stream.close()
+                sock.close()
+                sock = stream = None
+                with self.lock:
+                    self.active -= 1
+                    self.lock.notify_all()
+                self._requeue([file_path for file_path in shard if file_path not in done],
+                              f"{node[0]}:{node[1]} {str(e)}")
+                failures += 1
+                if failures > NODE_RETRIES or self.stopped:
+                    self._node_lost(node, str(e))
+                    return
+                time.sleep(min(2 ** failures, 10) * 0.5)
+        stream.close()
+        sock.close()
+
+
+# -------------------- 常驻扫描服务 --------------------
+# 后台常驻进程在内存中保留编译好的规则、文件编码/元数据缓存和一组预热的扫描引擎，
+# 界面和命令行通过本机 Unix 套接字提交批量任务，省去每次启动导入和重建缓存的开销。
+# 客户端和协议在 congsec_client.py 中
+DAEMON_POOL_SIZE = 2  # 同时执行的批量任务数，超出的请求排队
+DAEMON_RULE_SETS = 8  # 保留的已编译规则集数量
+DAEMON_TEXT_BATCH = 200
+DAEMON_ROW_BATCH = 50000
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        message = json.loads(line)
+        if message["type"] == "ping":
+            send_message(self.wfile, {"type": "pong", "stats": self.server.stats()})
+        elif message["type"] == "shutdown":
+            send_message(self.wfile, {"type": "bye"})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif message["type"] == "scan":
+            config, files = message.get("config"), message.get("files")
+            if not isinstance(config, dict) or not isinstance(files, list) \
+                    or not all(isinstance(file_path, str) for file_path in files):
+                send_message(self.wfile, {"type": "rejected", "message": "扫描请求格式错误"})
+                return
+            unknown = sorted(set(config) - set(DAEMON_CONFIG_KEYS))
+            if unknown:
+                send_message(self.wfile, {"type": "rejected",
+                                          "message": f"常驻扫描服务不接受这些配置项: {', '.join(unknown)}"})
+                return
+            self.server.scan(config, files, self.wfile, message.get("rows", True))
+
+
+if hasattr(socket, "AF_UNIX"):
+    class ScanDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, path=DAEMON_SOCKET_PATH, pool_size=DAEMON_POOL_SIZE):
+            if os.path.exists(path):
+                os.remove(path)  # 上次异常退出遗留的套接字文件
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            super().__init__(path, DaemonRequestHandler)
+            os.chmod(path, 0o600)  # 只有启动服务的用户能提交任务
+            self.path = path
+            self.lock = threading.Lock()
+            self.rule_sets = {}  # 配置摘要 -> 编译后的规则，按插入顺序淘汰
+            self.encoding_cache = {}  # 文件路径 -> 编码，所有引擎共用
+            self.metadata = {}  # 文件路径 -> (大小, 修改时间)，变化时作废该文件的编码缓存
+            self.scans = 0
+            self.pool = queue.Queue()
+            for _ in range(pool_size):
+                self.pool.put(WorkerThread({"keywords": []}, []))
+
+        def server_close(self):
+            super().server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+        def stats(self):
+            with self.lock:
+                return {"scans": self.scans, "rule_sets": len(self.rule_sets),
+                        "cached_files": len(self.metadata), "idle_workers": self.pool.qsize()}
+
+        def compiled_rules(self, config):
+            digest = hashlib.blake2b(json.dumps(config, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+            with self.lock:
+                rules = self.rule_sets.get(digest)
+            if rules is None:
+                rules = compile_rules(config)
+                with self.lock:
+                    self.rule_sets[digest] = rules
+                    while len(self.rule_sets) > DAEMON_RULE_SETS:
+                        del self.rule_sets[next(iter(self.rule_sets))]
+            return rules
+
+        def refresh_metadata(self, files):
+            for file_path in files:
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                stamp = (st.st_size, st.st_mtime_ns)
+                if self.metadata.get(file_path) != stamp:
+                    self.metadata[file_path] = stamp
+                    self.encoding_cache.pop(file_path, None)
+
+        def scan(self, config, files, stream, with_rows=True):
+            # 规则在服务端补全默认值并筛选已启用的；with_rows 为假时（命令行客户端只写报告）不回传结果行
+            rules = [normalize_rule(kw) for kw in config.get("keywords", [])]
+            config = dict(config, keywords=[kw for kw in rules if kw is not None and kw.get("enabled", True)])
+            engine = self.pool.get()
+            outcome = {}
+
+            def send(message, payload=None):
+                # 客户端断开时停止本次扫描
+                try:
+                    if payload is not None:
+                        stream.write(json.dumps(message).encode("utf-8") + b"\n")
+                        stream.write(payload)
+                        stream.flush()
+                    else:
+                        send_message(stream, message)
+                except OSError:
+                    engine.stop()
+
+            def send_rows(rows):
+                payload = HitBatch.from_rows(rows).to_bytes()
+                send({"type": "batch", "size": len(payload)}, payload)
+
+            try:
+                with self.lock:
+                    self.scans += 1
+                    self.refresh_metadata(files)
+                engine.config = config
+                engine.files = files
+                engine.is_running = True
+                engine.auto_detect_encoding = config.get("auto_detect_encoding", True)
+                engine.encoding_cache = self.encoding_cache
+                engine.rule_cache = (config, self.compiled_rules(config))
+                engine.progress_signal.connect(
+                    lambda current, total, name: send({"type": "progress", "current": current,
+                                                       "total": total, "name": name}))
+                engine.error_signal.connect(lambda text: send({"type": "error", "message": text}))
+                engine.result_signal.connect(lambda summary, store: outcome.update(summary=summary, store=store))
+                engine.run()
+                store = outcome.get("store")
+                if store is None:
+                    return
+                try:
+                    texts = []
+                    for text in store.iter_texts():
+                        texts.append(text)
+                        if len(texts) >= DAEMON_TEXT_BATCH:
+                            send({"type": "texts", "items": texts})
+                            texts = []
+                    rows = []
+                    for row in (store if with_rows else ()):
+                        rows.append(row)
+                        if len(rows) >= DAEMON_ROW_BATCH:
+                            send_rows(rows)
+                            rows = []
+                    send({"type": "texts", "items": texts})
+                    if rows:
+                        send_rows(rows)
+                    send({"type": "done", "summary": outcome["summary"]})
+                finally:
+                    store.close()
+            finally:
+                for signal in (engine.progress_signal, engine.error_signal, engine.result_signal):
+                    signal.disconnect()
+                engine.files = []
+                engine.config = {"keywords": []}
+                engine.rule_cache = None
+                self.pool.put(engine)
+
+
+class DaemonWorkerThread(WorkerThread):
+    # 把批量任务交给常驻服务执行，信号与 WorkerThread 相同，界面和命令行按原方式连接即可
+    def __init__(self, config, files, auto_detect_encoding=True, socket_path=DAEMON_SOCKET_PATH):
+        super().__init__(config, files, auto_detect_encoding)
+        self.socket_path = socket_path
+        self.sock = None
+
+    def run(self):
+        store = None
+        try:
+            # 服务进程的工作目录可能不同，路径一律转成绝对路径
+            config = dict(daemon_config(self.config), auto_detect_encoding=self.auto_detect_encoding)
+            files = [os.path.abspath(file_path) for file_path in self.files]
+            self.sock, stream = daemon_request(
+                {"type": "scan", "config": config, "files": files}, self.socket_path
+            )
+            store = ResultStore(self.config.get("memory_budget_mb", 0), fields=result_fields(self.config))
+            for message, payload in daemon_messages(stream):
+                if message["type"] == "progress":
+                    self.progress_signal.emit(message["current"], message["total"], message["name"])
+                elif message["type"] == "error":
+                    self.error_signal.emit(message["message"])
+                elif message["type"] == "texts":
+                    for text in message["items"]:
+                        store.add(text, [])
+                elif message["type"] == "batch":
+                    store.add(None, HitBatch.from_buffer(payload))
+                elif message["type"] == "done":
+                    store.finish()
+                    self.result_signal.emit(message["summary"], store)
+                    store = None
+        except Exception as e:
+            if self.is_running:
+                self.error_signal.emit(f"常驻扫描服务出错: {str(e)}")
+        finally:
+            if store is not None:
+                store.close()
+            if self.sock is not None:
+                self.sock.close()
+            self.finished_signal.emit()
+
+    def stop(self):
+        self.is_running = False
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+# -------------------- 规则列表模型 --------------------
+CONFIG_PATH = "config.json"
+
+
+def rule_display_text(kw, config):
+    words = kw.get("words", [])
+    exclude = kw.get("exclude", [])
+    lines = kw.get("nearby_lines", config["nearby_lines"])
+    chars = kw.get("nearby_chars", config["nearby_chars"])
+    down = kw.get("down_lines", config["down_lines"])
+    up = kw.get("up_lines", config["up_lines"])
+    kind = "正则" if kw.get("type", "text") == "regex" else "关键字"
+    text = f"{kind}: {'+'.join(words)} (行:{lines} 字符:{chars} 下:{down} 上:{up})"
+    if kw.get("category"):
+        text = f"[{kw['category']}] " + text
+    if exclude:
+        text += f" | 排除: {'/'.join(exclude)}"
+    if kw.get("multi_line_exclude", False):
+        text += " | 多行过滤: 是"
+    if kw.get("context_mode", "lines") == "block":
+        text += " | 配置块上下文"
+    if kw.get("ignore_case"):
+        text += " | 忽略大小写"
+    if kw.get("nfkc"):
+        text += " | NFKC"
+    if kw.get("columns"):
+        text += f" | 列: {'/'.join(kw['columns'])}"
+    return text
+
+
+class RuleListModel(QAbstractListModel):
+    # 直接读取 config["keywords"] 的列表模型，视图只为可见行取数据，规则再多也不卡；
+    # 行按分类排序实现分组，order[行号] 为规则在 config["keywords"] 中的下标
+    rule_toggled = pyqtSignal()
+
+    def __init__(self, config, parent=None):
+        super().__init__(parent)
+        self.config = config
+        self.order = []
+        self.sort_rules()
+
+    def sort_rules(self):
+        keywords = self.config["keywords"]
+        self.order = sorted(range(len(keywords)), key=lambda i: keywords[i].get("category", ""))
+
+    def rule_index(self, row):
+        return self.order[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        kw = self.config["keywords"][self.order[index.row()]]
+        if role == Qt.DisplayRole:
+            return rule_display_text(kw, self.config)
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if kw.get("enabled", True) else Qt.Unchecked
+        return None
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+        self.config["keywords"][self.order[index.row()]]["enabled"] = value == Qt.Checked
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.rule_toggled.emit()
+        return True
+
+    def set_enabled(self, rule_indexes, enabled):
+        for i in rule_indexes:
+            self.config["keywords"][i]["enabled"] = enabled
+        if rule_indexes:
+            self.refresh([Qt.CheckStateRole])
+            self.rule_toggled.emit()
+
+    def reset(self):
+        self.beginResetModel()
+        self.sort_rules()
+        self.endResetModel()
+
+    def refresh(self, roles=()):
+        if self.order:
+            self.dataChanged.emit(self.index(0), self.index(len(self.order) - 1), list(roles))
+
+
+class RuleFilterProxyModel(QSortFilterProxyModel):
+    # 按分类和搜索文本过滤
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.category = None
+        self.search_text = ""
+        self.setDynamicSortFilter(False)
+
+    def set_filter(self, category, search_text):
+        self.category = category
+        self.search_text = search_text.lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        kw = model.config["keywords"][model.rule_index(source_row)]
+        if self.category is not None and kw.get("category", "") != self.category:
+            return False
+        if self.search_text:
+            return self.search_text in rule_display_text(kw, model.config).lower()
+        return True
+
 # -------------------- 主窗口类 --------------------
 class CongsecGUI(QMainWindow):
     def __init__(self):
@@ -377,6 +3164,15 @@ class CongsecGUI(QMainWindow):
         self.result_buffer = []
         self.buffer_timer = QTimer()
         self.buffer_timer.timeout.connect(self.flush_buffer)
+        # 配置防抖保存：连续修改只在停止操作后写一次
+        self.save_timer = QTimer()
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(500)
+        self.save_timer.timeout.connect(self.save_config_now)
+        self.search_timer = QTimer()
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.apply_rule_filter)
         self.init_ui()
 
     def init_ui(self):
@@ -395,9 +3191,37 @@ class CongsecGUI(QMainWindow):
         # 关键字列表部分
         keyword_group = QGroupBox("关键字列表")
         keyword_layout = QVBoxLayout(keyword_group)
-        self.keyword_list = QListWidget()
-        self.update_keyword_list()
+        filter_layout = QHBoxLayout()
+        self.category_combo = QComboBox()
+        self.category_combo.currentIndexChanged.connect(self.apply_rule_filter)
+        filter_layout.addWidget(self.category_combo)
+        self.rule_search_edit = QLineEdit()
+        self.rule_search_edit.setPlaceholderText("搜索规则...")
+        self.rule_search_edit.textChanged.connect(lambda _: self.search_timer.start())
+        filter_layout.addWidget(self.rule_search_edit)
+        keyword_layout.addLayout(filter_layout)
+
+        self.rule_model = RuleListModel(self.config, self)
+        self.rule_model.rule_toggled.connect(self.save_config)
+        self.rule_proxy = RuleFilterProxyModel(self)
+        self.rule_proxy.setSourceModel(self.rule_model)
+        self.keyword_list = QListView()
+        self.keyword_list.setUniformItemSizes(True)
+        self.keyword_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.keyword_list.setModel(self.rule_proxy)
         keyword_layout.addWidget(self.keyword_list)
+        self.rule_count_label = QLabel("")
+        keyword_layout.addWidget(self.rule_count_label)
+        self.update_keyword_list()
+
+        check_layout = QHBoxLayout()
+        check_visible_btn = QPushButton("勾选可见")
+        check_visible_btn.clicked.connect(lambda: self.set_visible_rules_enabled(True))
+        check_layout.addWidget(check_visible_btn)
+        uncheck_visible_btn = QPushButton("取消勾选可见")
+        uncheck_visible_btn.clicked.connect(lambda: self.set_visible_rules_enabled(False))
+        check_layout.addWidget(uncheck_visible_btn)
+        keyword_layout.addLayout(check_layout)
 
         # 关键字操作按钮
         add_keyword_btn = QPushButton("添加关键字")
@@ -411,6 +3235,15 @@ class CongsecGUI(QMainWindow):
         delete_keyword_btn = QPushButton("删除选中关键字")
         delete_keyword_btn.clicked.connect(self.delete_keyword)
         keyword_layout.addWidget(delete_keyword_btn)
+
+        pack_layout = QHBoxLayout()
+        import_pack_btn = QPushButton("导入规则包")
+        import_pack_btn.clicked.connect(self.import_rule_pack)
+        pack_layout.addWidget(import_pack_btn)
+        export_pack_btn = QPushButton("导出可见规则")
+        export_pack_btn.clicked.connect(self.export_rule_pack)
+        pack_layout.addWidget(export_pack_btn)
+        keyword_layout.addLayout(pack_layout)
         config_layout.addWidget(keyword_group)
 
         # 默认配置部分
@@ -456,6 +3289,56 @@ class CongsecGUI(QMainWindow):
         up_layout.addWidget(self.up_spin)
         config_group_layout.addLayout(up_layout)
 
+        # 结果内存上限设置
+        budget_layout = QHBoxLayout()
+        budget_layout.addWidget(QLabel("结果内存上限(MB):"))
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(0, 65536)
+        self.budget_spin.setToolTip("批量处理结果超出该大小后转存到磁盘，0 表示不限制")
+        self.budget_spin.setValue(self.config.get("memory_budget_mb", 1024))
+        self.budget_spin.valueChanged.connect(self.update_default_config)
+        budget_layout.addWidget(self.budget_spin)
+        config_group_layout.addLayout(budget_layout)
+
+        # 单文件预算设置
+        file_budget_layout = QHBoxLayout()
+        file_budget_layout.addWidget(QLabel("单文件预算 秒/MB:"))
+        self.time_budget_spin = QSpinBox()
+        self.time_budget_spin.setRange(0, 86400)
+        self.time_budget_spin.setToolTip("单个文件扫描超过该秒数后放弃剩余部分并在统计中列出，0 表示不限制")
+        self.time_budget_spin.setValue(self.config.get("file_time_budget", 0))
+        self.time_budget_spin.valueChanged.connect(self.update_default_config)
+        file_budget_layout.addWidget(self.time_budget_spin)
+        self.size_budget_spin = QSpinBox()
+        self.size_budget_spin.setRange(0, 65536)
+        self.size_budget_spin.setToolTip("超过该大小的文件只扫描前面部分并在统计中列出，0 表示不限制")
+        self.size_budget_spin.setValue(self.config.get("file_size_budget_mb", 0))
+        self.size_budget_spin.valueChanged.connect(self.update_default_config)
+        file_budget_layout.addWidget(self.size_budget_spin)
+        config_group_layout.addLayout(file_budget_layout)
+
+        # 并行进程数设置
+        processes_layout = QHBoxLayout()
+        processes_layout.addWidget(QLabel("并行扫描进程数:"))
+        self.processes_spin = QSpinBox()
+        self.processes_spin.setRange(0, 256)
+        self.processes_spin.setToolTip("大于 1 时按文件大小打包调度到多个进程，大文件优先；0 或 1 表示单进程顺序扫描")
+        self.processes_spin.setValue(self.config.get("scan_processes", 0))
+        self.processes_spin.valueChanged.connect(self.update_default_config)
+        processes_layout.addWidget(self.processes_spin)
+        config_group_layout.addLayout(processes_layout)
+
+        # 超长行分段设置
+        long_line_layout = QHBoxLayout()
+        long_line_layout.addWidget(QLabel("超长行分段字符数:"))
+        self.long_line_spin = QSpinBox()
+        self.long_line_spin.setRange(0, 100000000)
+        self.long_line_spin.setToolTip("超过该长度的行（压缩 JS、单行 JSON 等）切成虚拟分段再匹配，0 表示不分段")
+        self.long_line_spin.setValue(self.config.get("long_line_chars", LONG_LINE_CHARS))
+        self.long_line_spin.valueChanged.connect(self.update_default_config)
+        long_line_layout.addWidget(self.long_line_spin)
+        config_group_layout.addLayout(long_line_layout)
+
         # 自动导出选项
         self.auto_export_cb = QCheckBox("后台自动导出CSV")
         self.auto_export_cb.setChecked(self.config.get("auto_export", True))
@@ -468,6 +3351,90 @@ class CongsecGUI(QMainWindow):
         self.auto_detect_encoding_cb.toggled.connect(self.toggle_auto_detect_encoding)
         config_group_layout.addWidget(self.auto_detect_encoding_cb)
 
+        # 输出模式设置
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(QLabel("输出模式:"))
+        self.output_mode_combo = QComboBox()
+        for mode, label in OUTPUT_MODES:
+            self.output_mode_combo.addItem(label, mode)
+        self.output_mode_combo.setCurrentIndex(
+            max(0, self.output_mode_combo.findData(self.config.get("output_mode", "full")))
+        )
+        self.output_mode_combo.setToolTip("仅统计/仅列文件模式不生成上下文，命中满足后提前结束该文件的扫描")
+        self.output_mode_combo.currentIndexChanged.connect(self.update_default_config)
+        mode_layout.addWidget(self.output_mode_combo)
+        config_group_layout.addLayout(mode_layout)
+
+        max_hits_layout = QHBoxLayout()
+        max_hits_layout.addWidget(QLabel("每文件每规则最多命中:"))
+        self.max_hits_spin = QSpinBox()
+        self.max_hits_spin.setRange(0, 1000000)
+        self.max_hits_spin.setToolTip("达到后停止该规则在该文件中的扫描，0 表示不限制")
+        self.max_hits_spin.setValue(self.config.get("max_hits", 0))
+        self.max_hits_spin.valueChanged.connect(self.update_default_config)
+        max_hits_layout.addWidget(self.max_hits_spin)
+        config_group_layout.addLayout(max_hits_layout)
+
+        # 合并上下文选项
+        self.context_merge_cb = QCheckBox("合并重叠上下文")
+        self.context_merge_cb.setToolTip("同一规则的命中上下文重叠或相邻时合并为一组输出（类似 grep -C）")
+        self.context_merge_cb.setChecked(self.config.get("context_merge", False))
+        self.context_merge_cb.toggled.connect(self.toggle_context_merge)
+        config_group_layout.addWidget(self.context_merge_cb)
+
+        # 文件去重选项
+        self.dedup_files_cb = QCheckBox("相同内容文件只扫描一次")
+        self.dedup_files_cb.setChecked(self.config.get("dedup_files", True))
+        self.dedup_files_cb.toggled.connect(self.toggle_dedup_files)
+        config_group_layout.addWidget(self.dedup_files_cb)
+
+        # 命中聚合选项
+        self.aggregate_hits_cb = QCheckBox("聚合相同命中")
+        self.aggregate_hits_cb.setToolTip("上下文相同的命中合并为一条，显示次数和涉及文件（仅完整上下文模式）")
+        self.aggregate_hits_cb.setChecked(self.config.get("aggregate_hits", False))
+        self.aggregate_hits_cb.toggled.connect(self.toggle_aggregate_hits)
+        config_group_layout.addWidget(self.aggregate_hits_cb)
+
+        # 表格按列检索选项
+        self.structured_tables_cb = QCheckBox("CSV/TSV 按列检索")
+        self.structured_tables_cb.setToolTip("逐条解析 CSV/TSV 记录，规则可限定只在指定列中查找，结果给出数据行号和列内容")
+        self.structured_tables_cb.setChecked(self.config.get("structured_tables", False))
+        self.structured_tables_cb.toggled.connect(self.toggle_structured_tables)
+        config_group_layout.addWidget(self.structured_tables_cb)
+
+        # 结果入库选项
+        self.persist_results_cb = QCheckBox("批量结果写入结果库")
+        self.persist_results_cb.setToolTip(f"命中、运行信息和规则定义保存到 {RESULT_DB_PATH}，可在“结果库”页查询对比")
+        self.persist_results_cb.setChecked(self.config.get("persist_results", False))
+        self.persist_results_cb.toggled.connect(self.toggle_persist_results)
+        config_group_layout.addWidget(self.persist_results_cb)
+
+        # 常驻扫描服务选项
+        self.use_daemon_cb = QCheckBox("提交给常驻扫描服务")
+        self.use_daemon_cb.setToolTip("需先运行 python congsec.py daemon start；服务未运行时自动改为本机扫描")
+        self.use_daemon_cb.setChecked(self.config.get("use_daemon", False))
+        self.use_daemon_cb.setEnabled(hasattr(socket, "AF_UNIX"))
+        self.use_daemon_cb.toggled.connect(self.toggle_use_daemon)
+        config_group_layout.addWidget(self.use_daemon_cb)
+
+        # 分布式扫描节点设置
+        nodes_layout = QHBoxLayout()
+        nodes_layout.addWidget(QLabel("扫描节点:"))
+        self.worker_nodes_edit = QLineEdit(", ".join(self.config.get("worker_nodes", [])))
+        self.worker_nodes_edit.setPlaceholderText("host:port，逗号分隔；留空在本机扫描")
+        self.worker_nodes_edit.setToolTip("节点上运行 python congsec.py worker，文件路径需在节点上可读")
+        self.worker_nodes_edit.editingFinished.connect(self.update_worker_nodes)
+        nodes_layout.addWidget(self.worker_nodes_edit)
+        config_group_layout.addLayout(nodes_layout)
+        token_layout = QHBoxLayout()
+        token_layout.addWidget(QLabel("节点口令:"))
+        self.worker_token_edit = QLineEdit(self.config.get("worker_token", ""))
+        self.worker_token_edit.setEchoMode(QLineEdit.Password)
+        self.worker_token_edit.setToolTip("与节点启动时 --token 指定的共享口令一致")
+        self.worker_token_edit.editingFinished.connect(self.update_worker_token)
+        token_layout.addWidget(self.worker_token_edit)
+        config_group_layout.addLayout(token_layout)
+
         config_layout.addWidget(config_group)
         config_layout.addStretch()
 
@@ -575,12 +3542,67 @@ class CongsecGUI(QMainWindow):
         realtime_layout.addWidget(result_group_realtime)
         self.tab_widget.addTab(realtime_tab, "单个匹配")
 
+        # 结果库标签页
+        db_tab = QWidget()
+        db_layout = QVBoxLayout(db_tab)
+
+        query_group = QGroupBox("查询条件")
+        query_layout = QVBoxLayout(query_group)
+
+        run_layout = QHBoxLayout()
+        run_layout.addWidget(QLabel("运行批次:"))
+        self.db_run_combo = QComboBox()
+        self.db_run_combo.currentIndexChanged.connect(self.refresh_db_rules)
+        run_layout.addWidget(self.db_run_combo, 1)
+        run_layout.addWidget(QLabel("对比批次:"))
+        self.db_base_combo = QComboBox()
+        run_layout.addWidget(self.db_base_combo, 1)
+        refresh_db_btn = QPushButton("刷新")
+        refresh_db_btn.clicked.connect(self.refresh_db_runs)
+        run_layout.addWidget(refresh_db_btn)
+        query_layout.addLayout(run_layout)
+
+        rule_layout = QHBoxLayout()
+        rule_layout.addWidget(QLabel("命中规则:"))
+        self.db_rule_combo = QComboBox()
+        self.db_rule_combo.setEditable(True)
+        rule_layout.addWidget(self.db_rule_combo, 1)
+        rule_layout.addWidget(QLabel("且未命中规则:"))
+        self.db_without_combo = QComboBox()
+        self.db_without_combo.setEditable(True)
+        rule_layout.addWidget(self.db_without_combo, 1)
+        query_layout.addLayout(rule_layout)
+
+        file_filter_layout = QHBoxLayout()
+        file_filter_layout.addWidget(QLabel("文件路径包含:"))
+        self.db_file_edit = QLineEdit()
+        file_filter_layout.addWidget(self.db_file_edit)
+        query_layout.addLayout(file_filter_layout)
+
+        db_btn_layout = QHBoxLayout()
+        for text, handler in [("查询命中", self.db_query_hits), ("按规则统计", self.db_count_by_rule),
+                              ("按文件统计", self.db_count_by_file), ("批次对比", self.db_diff_runs)]:
+            btn = QPushButton(text)
+            btn.clicked.connect(handler)
+            db_btn_layout.addWidget(btn)
+        query_layout.addLayout(db_btn_layout)
+        db_layout.addWidget(query_group)
+
+        db_result_group = QGroupBox("查询结果")
+        db_result_layout = QVBoxLayout(db_result_group)
+        self.db_result_text = QPlainTextEdit()
+        self.db_result_text.setReadOnly(True)
+        db_result_layout.addWidget(self.db_result_text)
+        db_layout.addWidget(db_result_group)
+        self.tab_widget.addTab(db_tab, "结果库")
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
+
         right_panel.addWidget(self.tab_widget)
         main_layout.addWidget(config_panel)
         main_layout.addLayout(right_panel)
 
     def load_config(self):
-        config_path = "config.json"
+        config_path = CONFIG_PATH
         default_config = {
             "keywords": [],
             "nearby_lines": 2,
@@ -588,7 +3610,22 @@ class CongsecGUI(QMainWindow):
             "down_lines": 0,
             "up_lines": 0,
             "auto_export": True,
-            "auto_detect_encoding": True
+            "auto_detect_encoding": True,
+            "memory_budget_mb": 1024,
+            "file_time_budget": 0,
+            "file_size_budget_mb": 0,
+            "long_line_chars": LONG_LINE_CHARS,
+            "scan_processes": 0,
+            "persist_results": False,
+            "worker_nodes": [],
+            "worker_token": "",
+            "use_daemon": False,
+            "aggregate_hits": False,
+            "dedup_files": True,
+            "structured_tables": False,
+            "context_merge": False,
+            "output_mode": "full",
+            "max_hits": 0
         }
         
         if os.path.exists(config_path):
@@ -596,26 +3633,9 @@ class CongsecGUI(QMainWindow):
                 with open(config_path, 'r', encoding='utf-8') as f:
                     config = json.load(f)
                     # 兼容旧版配置
-                    for idx, kw in enumerate(config.get("keywords", [])):
-                        if isinstance(kw, str):
-                            config["keywords"][idx] = {
-                                "words": [kw],
-                                "exclude": [],
-                                "enabled": True,
-                                "down_lines": 0,
-                                "up_lines": 0,
-                                "exclude_nearby": True,
-                                "multi_line_exclude": False
-                            }
-                        elif isinstance(kw, dict):
-                            if "word" in kw:
-                                kw["words"] = [kw.pop("word")]
-                            kw.setdefault("exclude", [])
-                            kw.setdefault("enabled", True)
-                            kw.setdefault("down_lines", 0)
-                            kw.setdefault("up_lines", 0)
-                            kw.setdefault("exclude_nearby", True)
-                            kw.setdefault("multi_line_exclude", False)
+                    config["keywords"] = [
+                        kw for kw in map(normalize_rule, config.get("keywords", [])) if kw is not None
+                    ]
                     # 确保所有默认配置项都存在
                     for key in default_config:
                         config.setdefault(key, default_config[key])
@@ -630,35 +3650,144 @@ class CongsecGUI(QMainWindow):
             return default_config.copy()
 
     def save_config(self):
-        with open("config.json", 'w', encoding='utf-8') as f:
+        self.save_timer.start()
+
+    def save_config_now(self):
+        # 先写临时文件再替换，避免写到一半崩溃导致配置损坏
+        self.save_timer.stop()
+        tmp_path = CONFIG_PATH + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(self.config, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, CONFIG_PATH)
 
     def update_keyword_list(self):
-        self.keyword_list.clear()
-        for kw in self.config["keywords"]:
-            words = kw.get("words", [])
-            exclude = kw.get("exclude", [])
-            lines = kw.get("nearby_lines", self.config["nearby_lines"])
-            chars = kw.get("nearby_chars", self.config["nearby_chars"])
-            down = kw.get("down_lines", self.config["down_lines"])
-            up = kw.get("up_lines", self.config["up_lines"])
-            text = f"关键字: {'+'.join(words)} (行:{lines} 字符:{chars} 下:{down} 上:{up})"
-            if exclude:
-                text += f" | 排除: {'/'.join(exclude)}"
-            if kw.get("multi_line_exclude", False):
-                text += " | 多行过滤: 是"
-            item = QListWidgetItem(text)
-            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(Qt.Checked if kw.get("enabled", True) else Qt.Unchecked)
-            self.keyword_list.addItem(item)
+        self.rule_model.reset()
+        self.refresh_categories()
+        self.apply_rule_filter()
+
+    def refresh_categories(self):
+        current = self.category_combo.currentData()
+        categories = sorted({kw.get("category", "") for kw in self.config["keywords"]})
+        self.category_combo.blockSignals(True)
+        self.category_combo.clear()
+        self.category_combo.addItem("全部分类", None)
+        for category in categories:
+            self.category_combo.addItem(category or "未分类", category)
+        index = self.category_combo.findData(current) if current is not None else 0
+        self.category_combo.setCurrentIndex(max(index, 0))
+        self.category_combo.blockSignals(False)
+
+    def apply_rule_filter(self):
+        self.search_timer.stop()
+        self.rule_proxy.set_filter(self.category_combo.currentData(), self.rule_search_edit.text().strip())
+        self.rule_count_label.setText(
+            f"显示 {self.rule_proxy.rowCount()} / 共 {len(self.config['keywords'])} 条规则"
+        )
+
+    def _rule_index_of(self, proxy_index):
+        return self.rule_model.rule_index(self.rule_proxy.mapToSource(proxy_index).row())
+
+    def _visible_rule_rows(self):
+        return sorted(self._rule_index_of(self.rule_proxy.index(i, 0))
+                      for i in range(self.rule_proxy.rowCount()))
+
+    def _selected_rule_rows(self):
+        return sorted({self._rule_index_of(index)
+                       for index in self.keyword_list.selectionModel().selectedIndexes()})
+
+    def _current_rule_row(self):
+        index = self.keyword_list.currentIndex()
+        if not index.isValid():
+            return -1
+        return self._rule_index_of(index)
+
+    def set_visible_rules_enabled(self, enabled):
+        self.rule_model.set_enabled(self._visible_rule_rows(), enabled)
+
+    def import_rule_pack(self):
+        files, _ = QFileDialog.getOpenFileNames(
+            self, "导入规则包", "", "Rule Packs (*.json *.txt);;All Files (*)"
+        )
+        if not files:
+            return
+        existing = {rule_key(kw) for kw in self.config["keywords"]}
+        imported, duplicated, invalid = 0, 0, 0
+        for path in files:
+            pack_name = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path, 'r', encoding='utf-8-sig') as f:
+                    if path.lower().endswith(".json"):
+                        pack = json.load(f)
+                        if isinstance(pack, dict):
+                            pack_name = pack.get("name", pack_name)
+                            rules = pack.get("keywords", [])
+                        else:
+                            rules = pack
+                    else:
+                        # 纯文本情报列表：每行一个关键字，# 开头为注释
+                        rules = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+            except Exception as e:
+                QMessageBox.warning(self, "导入失败", f"读取规则包 {path} 出错: {e}")
+                continue
+            for kw in rules:
+                kw = normalize_rule(kw)
+                if kw is None or not kw["words"]:
+                    invalid += 1
+                    continue
+                if not kw["category"]:
+                    kw["category"] = pack_name
+                if kw["type"] == "regex":
+                    try:
+                        for word in kw["words"]:
+                            validate_regex(word)
+                    except ValueError:
+                        invalid += 1
+                        continue
+                key = rule_key(kw)
+                if key in existing:
+                    duplicated += 1
+                    continue
+                existing.add(key)
+                self.config["keywords"].append(kw)
+                imported += 1
+        self.save_config()
+        self.update_keyword_list()
+        QMessageBox.information(
+            self, "导入完成", f"导入 {imported} 条规则，跳过重复 {duplicated} 条，无效 {invalid} 条"
+        )
+
+    def export_rule_pack(self):
+        rows = self._visible_rule_rows()
+        if not rows:
+            QMessageBox.warning(self, "警告", "没有可导出的规则")
+            return
+        category = self.category_combo.currentData()
+        name = category or "rules"
+        filename, _ = QFileDialog.getSaveFileName(self, "导出规则包", f"{name}.json", "JSON Files (*.json)")
+        if not filename:
+            return
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump({"name": name, "keywords": [self.config["keywords"][row] for row in rows]},
+                          f, ensure_ascii=False, indent=4)
+            QMessageBox.information(self, "成功", f"已导出 {len(rows)} 条规则到: {filename}")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导出失败: {str(e)}")
 
     def update_default_config(self):
         self.config["nearby_lines"] = self.lines_spin.value()
         self.config["nearby_chars"] = self.chars_spin.value()
         self.config["down_lines"] = self.down_spin.value()
         self.config["up_lines"] = self.up_spin.value()
+        self.config["memory_budget_mb"] = self.budget_spin.value()
+        self.config["file_time_budget"] = self.time_budget_spin.value()
+        self.config["file_size_budget_mb"] = self.size_budget_spin.value()
+        self.config["long_line_chars"] = self.long_line_spin.value()
+        self.config["scan_processes"] = self.processes_spin.value()
+        self.config["output_mode"] = self.output_mode_combo.currentData()
+        self.config["max_hits"] = self.max_hits_spin.value()
         self.save_config()
-        self.update_keyword_list()
+        self.rule_model.refresh()
 
     def toggle_auto_export(self, checked):
         self.config["auto_export"] = checked
@@ -668,12 +3797,51 @@ class CongsecGUI(QMainWindow):
         self.config["auto_detect_encoding"] = checked
         self.save_config()
 
+    def toggle_context_merge(self, checked):
+        self.config["context_merge"] = checked
+        self.save_config()
+
+    def toggle_dedup_files(self, checked):
+        self.config["dedup_files"] = checked
+        self.save_config()
+
+    def toggle_structured_tables(self, checked):
+        self.config["structured_tables"] = checked
+        self.save_config()
+
+    def toggle_aggregate_hits(self, checked):
+        self.config["aggregate_hits"] = checked
+        self.save_config()
+
+    def toggle_persist_results(self, checked):
+        self.config["persist_results"] = checked
+        self.save_config()
+
+    def toggle_use_daemon(self, checked):
+        self.config["use_daemon"] = checked
+        self.save_config()
+
+    def update_worker_nodes(self):
+        text = self.worker_nodes_edit.text()
+        self.config["worker_nodes"] = [node.strip() for node in text.split(",") if node.strip()]
+        self.save_config()
+
+    def update_worker_token(self):
+        self.config["worker_token"] = self.worker_token_edit.text()
+        self.save_config()
+
     def add_keyword_dialog(self):
         dialog = QDialog(self)
         dialog.setWindowTitle("添加关键字")
         dialog.setModal(True)
         layout = QVBoxLayout(dialog)
 
+        type_combo = QComboBox()
+        type_combo.addItem("文本", "text")
+        type_combo.addItem("正则", "regex")
+        type_combo.setToolTip("正则规则每行一个表达式，排除文本仍按普通文本匹配")
+        category_combo = self._category_input(self.category_combo.currentData() or "")
+
         keyword_edit = QPlainTextEdit()
         keyword_edit.setMaximumHeight(80)
         exclude_edit = QPlainTextEdit()
@@ -701,7 +3869,20 @@ class CongsecGUI(QMainWindow):
         multi_line_cb = QCheckBox("多行关键字参与附近匹配过滤")
         multi_line_cb.setToolTip("勾选后，除第一行外的其他关键字如果在附近内容中出现，将排除该结果")
 
-        layout.addWidget(QLabel("关键字（每行/逗号分隔，需全部匹配）:"))
+        block_cb = QCheckBox("上下文取所在配置块（interface/router 等）")
+        block_cb.setToolTip("勾选后，以顶格行开始的整个配置块作为上下文，其余关键字需出现在同一块中，忽略附近行数和附近字符数")
+
+        ignore_case_cb = QCheckBox("忽略大小写")
+        nfkc_cb = QCheckBox("全角/半角等兼容字符视为相同（NFKC）")
+        nfkc_cb.setToolTip("勾选后，ＡＢＣ１２３ 与 ABC123 视为相同；正则规则请按半角书写")
+
+        columns_edit = QLineEdit()
+
+        layout.addWidget(QLabel("规则类型:"))
+        layout.addWidget(type_combo)
+        layout.addWidget(QLabel("分类:"))
+        layout.addWidget(category_combo)
+        layout.addWidget(QLabel("关键字（每行/逗号分隔，需全部匹配；正则每行一个）:"))
         layout.addWidget(keyword_edit)
         layout.addWidget(QLabel("附近行数:"))
         layout.addWidget(lines_spin)
@@ -713,16 +3894,22 @@ class CongsecGUI(QMainWindow):
         layout.addWidget(up_spin)
         layout.addWidget(exclude_nearby_cb)
         layout.addWidget(multi_line_cb)
+        layout.addWidget(block_cb)
+        layout.addWidget(ignore_case_cb)
+        layout.addWidget(nfkc_cb)
         layout.addWidget(QLabel("排除文本（每行/逗号分隔，命中其一即排除）:"))
         layout.addWidget(exclude_edit)
+        layout.addWidget(QLabel("限定列（逗号分隔，仅 CSV/TSV 按列检索时生效）:"))
+        layout.addWidget(columns_edit)
 
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        button_box.accepted.connect(dialog.accept)
+        button_box.accepted.connect(lambda: self._accept_rule_dialog(dialog, type_combo, keyword_edit))
         button_box.rejected.connect(dialog.reject)
         layout.addWidget(button_box)
 
         if dialog.exec_() == QDialog.Accepted:
-            words = [w.strip() for w in re.split(r'[,\n]', keyword_edit.toPlainText()) if w.strip()]
+            rule_type = type_combo.currentData()
+            words = self._split_rule_words(keyword_edit.toPlainText(), rule_type)
             exclude = [e.strip() for e in re.split(r'[,\n]', exclude_edit.toPlainText()) if e.strip()]
             if words:
                 new_keyword = {
@@ -734,14 +3921,20 @@ class CongsecGUI(QMainWindow):
                     "up_lines": up_spin.value(),
                     "enabled": True,
                     "exclude_nearby": exclude_nearby_cb.isChecked(),
-                    "multi_line_exclude": multi_line_cb.isChecked()
+                    "multi_line_exclude": multi_line_cb.isChecked(),
+                    "context_mode": "block" if block_cb.isChecked() else "lines",
+                    "ignore_case": ignore_case_cb.isChecked(),
+                    "nfkc": nfkc_cb.isChecked(),
+                    "columns": [c.strip() for c in columns_edit.text().split(",") if c.strip()],
+                    "type": rule_type,
+                    "category": category_combo.currentText().strip()
                 }
                 self.config["keywords"].append(new_keyword)
                 self.save_config()
                 self.update_keyword_list()
 
     def edit_keyword_dialog(self):
-        current_row = self.keyword_list.currentRow()
+        current_row = self._current_rule_row()
         if current_row < 0 or current_row >= len(self.config["keywords"]):
             QMessageBox.warning(self, "警告", "请先选择一个关键字进行编辑")
             return
@@ -752,6 +3945,13 @@ class CongsecGUI(QMainWindow):
         dialog.setModal(True)
         layout = QVBoxLayout(dialog)
 
+        type_combo = QComboBox()
+        type_combo.addItem("文本", "text")
+        type_combo.addItem("正则", "regex")
+        type_combo.setToolTip("正则规则每行一个表达式，排除文本仍按普通文本匹配")
+        type_combo.setCurrentIndex(type_combo.findData(kw.get("type", "text")))
+        category_combo = self._category_input(kw.get("category", ""))
+
         keyword_edit = QPlainTextEdit()
         keyword_edit.setPlainText("\n".join(kw.get("words", [])))
         keyword_edit.setMaximumHeight(80)
@@ -783,7 +3983,23 @@ class CongsecGUI(QMainWindow):
         multi_line_cb.setChecked(kw.get("multi_line_exclude", False))
         multi_line_cb.setToolTip("勾选后，除第一行外的其他关键字如果在附近内容中出现，将排除该结果")
 
-        layout.addWidget(QLabel("关键字（每行/逗号分隔，需全部匹配）:"))
+        block_cb = QCheckBox("上下文取所在配置块（interface/router 等）")
+        block_cb.setToolTip("勾选后，以顶格行开始的整个配置块作为上下文，其余关键字需出现在同一块中，忽略附近行数和附近字符数")
+        block_cb.setChecked(kw.get("context_mode", "lines") == "block")
+
+        ignore_case_cb = QCheckBox("忽略大小写")
+        ignore_case_cb.setChecked(kw.get("ignore_case", False))
+        nfkc_cb = QCheckBox("全角/半角等兼容字符视为相同（NFKC）")
+        nfkc_cb.setToolTip("勾选后，ＡＢＣ１２３ 与 ABC123 视为相同；正则规则请按半角书写")
+        nfkc_cb.setChecked(kw.get("nfkc", False))
+
+        columns_edit = QLineEdit(", ".join(kw.get("columns", [])))
+
+        layout.addWidget(QLabel("规则类型:"))
+        layout.addWidget(type_combo)
+        layout.addWidget(QLabel("分类:"))
+        layout.addWidget(category_combo)
+        layout.addWidget(QLabel("关键字（每行/逗号分隔，需全部匹配；正则每行一个）:"))
         layout.addWidget(keyword_edit)
         layout.addWidget(QLabel("附近行数:"))
         layout.addWidget(lines_spin)
@@ -795,16 +4011,22 @@ class CongsecGUI(QMainWindow):
         layout.addWidget(up_spin)
         layout.addWidget(exclude_nearby_cb)
         layout.addWidget(multi_line_cb)
+        layout.addWidget(block_cb)
+        layout.addWidget(ignore_case_cb)
+        layout.addWidget(nfkc_cb)
         layout.addWidget(QLabel("排除文本（每行/逗号分隔，命中其一即排除）:"))
         layout.addWidget(exclude_edit)
+        layout.addWidget(QLabel("限定列（逗号分隔，仅 CSV/TSV 按列检索时生效）:"))
+        layout.addWidget(columns_edit)
 
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        button_box.accepted.connect(dialog.accept)
+        button_box.accepted.connect(lambda: self._accept_rule_dialog(dialog, type_combo, keyword_edit))
         button_box.rejected.connect(dialog.reject)
         layout.addWidget(button_box)
 
         if dialog.exec_() == QDialog.Accepted:
-            words = [w.strip() for w in re.split(r'[,\n]', keyword_edit.toPlainText()) if w.strip()]
+            rule_type = type_combo.currentData()
+            words = self._split_rule_words(keyword_edit.toPlainText(), rule_type)
             exclude = [e.strip() for e in re.split(r'[,\n]', exclude_edit.toPlainText()) if e.strip()]
             if words:
                 self.config["keywords"][current_row] = {
@@ -816,27 +4038,60 @@ class CongsecGUI(QMainWindow):
                     "up_lines": up_spin.value(),
                     "enabled": kw.get("enabled", True),
                     "exclude_nearby": exclude_nearby_cb.isChecked(),
-                    "multi_line_exclude": multi_line_cb.isChecked()
+                    "multi_line_exclude": multi_line_cb.isChecked(),
+                    "context_mode": "block" if block_cb.isChecked() else "lines",
+                    "ignore_case": ignore_case_cb.isChecked(),
+                    "nfkc": nfkc_cb.isChecked(),
+                    "columns": [c.strip() for c in columns_edit.text().split(",") if c.strip()],
+                    "type": rule_type,
+                    "category": category_combo.currentText().strip()
                 }
                 self.save_config()
                 self.update_keyword_list()
 
+    def _category_input(self, current):
+        combo = QComboBox()
+        combo.setEditable(True)
+        combo.addItems(sorted({kw.get("category", "") for kw in self.config["keywords"]} - {""}))
+        combo.setEditText(current)
+        return combo
+
+    def _split_rule_words(self, text, rule_type):
+        # 正则中常含逗号（如 \d{1,3}），只按行分隔
+        separator = r'\n' if rule_type == "regex" else r'[,\n]'
+        return [w.strip() for w in re.split(separator, text) if w.strip()]
+
+    def _accept_rule_dialog(self, dialog, type_combo, keyword_edit):
+        rule_type = type_combo.currentData()
+        if rule_type == "regex":
+            for word in self._split_rule_words(keyword_edit.toPlainText(), rule_type):
+                try:
+                    validate_regex(word)
+                except ValueError as e:
+                    QMessageBox.warning(dialog, "正则无效", str(e))
+                    return
+        dialog.accept()
+
     def delete_keyword(self):
-        current_row = self.keyword_list.currentRow()
-        if current_row >= 0 and current_row < len(self.config["keywords"]):
-            reply = QMessageBox.question(self, "确认删除", "确定要删除这个关键字吗？", QMessageBox.Yes | QMessageBox.No)
+        rows = self._selected_rule_rows()
+        if rows:
+            reply = QMessageBox.question(self, "确认删除", f"确定要删除选中的 {len(rows)} 个关键字吗？", QMessageBox.Yes | QMessageBox.No)
             if reply == QMessageBox.Yes:
-                self.config["keywords"].pop(current_row)
+                removed = set(rows)
+                self.config["keywords"][:] = [
+                    kw for row, kw in enumerate(self.config["keywords"]) if row not in removed
+                ]
                 self.save_config()
                 self.update_keyword_list()
 
     def _enabled_keywords(self):
-        enabled = []
-        for row, kw in enumerate(self.config["keywords"]):
-            item = self.keyword_list.item(row)
-            if item.checkState() == Qt.Checked:
-                enabled.append(kw)
-        return enabled
+        return [kw for kw in self.config["keywords"] if kw.get("enabled", True)]
+
+    def _run_config(self):
+        # 本次运行使用的配置：全部全局选项 + 已勾选的规则
+        run_config = {key: value for key, value in self.config.items() if key != "keywords"}
+        run_config["keywords"] = self._enabled_keywords()
+        return run_config
 
     def select_files(self):
         files, _ = QFileDialog.getOpenFileNames(
@@ -867,15 +4122,15 @@ class CongsecGUI(QMainWindow):
         self.export_csv_btn.setVisible(False)
         self.result_text.clear()
 
-        enabled_config = {
-            "keywords": self._enabled_keywords(),
-            "nearby_lines": self.config["nearby_lines"],
-            "nearby_chars": self.config["nearby_chars"],
-            "down_lines": self.config["down_lines"],
-            "up_lines": self.config["up_lines"]
-        }
+        enabled_config = self._run_config()
 
-        self.worker_thread = WorkerThread(
+        worker_class = WorkerThread
+        if self.config.get("use_daemon", False):
+            if daemon_available():
+                worker_class = DaemonWorkerThread
+            else:
+                self.progress_label.setText("常驻扫描服务未运行，改为本机扫描")
+        self.worker_thread = worker_class(
             enabled_config, 
             self.selected_files,
             self.config.get("auto_detect_encoding", True)
@@ -896,7 +4151,8 @@ class CongsecGUI(QMainWindow):
         self.progress_bar.setValue(current)
         self.progress_label.setText(f"正在处理: {filename} ({current}/{total})")
 
-    def show_batch_results(self, result_text, results):
+    def show_batch_results(self, summary, results):
+        result_text = summary + "\n\n" + results.render_text()
         if not self.show_excluded_cb_batch.isChecked():
             lines = [line for line in result_text.splitlines() if not line.startswith("已排除（")]
             cleaned, prev_separator = [], False
@@ -911,6 +4167,7 @@ class CongsecGUI(QMainWindow):
                 prev_separator = False
             result_text = "\n".join(cleaned)
 
+        self.release_results()
         self.current_results = results
         self.result_text.setPlainText(result_text)
         self.export_csv_btn.setVisible(len(results) > 0)
@@ -918,6 +4175,18 @@ class CongsecGUI(QMainWindow):
         if self.config.get("auto_export", True) and results:
             self.auto_export_results(results, "batch")
 
+    def release_results(self):
+        if isinstance(self.current_results, ResultStore):
+            self.current_results.close()
+        self.current_results = []
+
+    def closeEvent(self, event):
+        self.stop_processing()
+        self.release_results()
+        if self.save_timer.isActive():
+            self.save_config_now()
+        super().closeEvent(event)
+
     def show_error(self, error_msg):
         QMessageBox.critical(self, "错误", error_msg)
 
@@ -952,16 +4221,15 @@ class CongsecGUI(QMainWindow):
         self.result_buffer = []
         self.buffer_timer.start(100)
 
-        enabled_config = {
-            "keywords": self._enabled_keywords(),
-            "nearby_lines": self.config["nearby_lines"],
-            "nearby_chars": self.config["nearby_chars"],
-            "down_lines": self.config["down_lines"],
-            "up_lines": self.config["up_lines"]
-        }
+        enabled_config = self._run_config()
 
         worker = WorkerThread(enabled_config, [], self.config.get("auto_detect_encoding", True))
-        result_text, results = worker.process_text(text, enabled_config, "实时输入")
+        try:
+            result_text, results = worker.process_text(text, enabled_config, "实时输入")
+        except ValueError as e:
+            self.buffer_timer.stop()
+            QMessageBox.warning(self, "规则错误", str(e))
+            return
 
         if not self.show_excluded_cb_realtime.isChecked():
             lines = [line for line in result_text.splitlines() if not line.startswith("已排除（")]
@@ -977,7 +4245,9 @@ class CongsecGUI(QMainWindow):
                 prev_separator = False
             result_text = "\n".join(cleaned)
 
-        self.current_results = results
+        self.release_results()
+        self.current_results = ResultStore(fields=result_fields(enabled_config))
+        self.current_results.add(result_text, results)
         self.result_buffer = result_text.splitlines()
         self.result_text_realtime.clear()
         self.buffer_timer.start(100)
@@ -988,10 +4258,8 @@ class CongsecGUI(QMainWindow):
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = os.path.join("data", f"{prefix}_{timestamp}.csv")
             with open(filename, "w", newline='', encoding='utf-8-sig') as f:
-                writer = csv.DictWriter(f, fieldnames=[
-                    'keywords', 'line_number', 'nearby_lines', 'nearby_chars',
-                    'down_lines', 'up_lines', 'source', 'file_path', 'exclude_text'
-                ])
+                fields = getattr(results, "fields", RESULT_FIELDS)
+                writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
                 writer.writeheader()
                 for row in results:
                     writer.writerow(row)
@@ -1021,6 +4289,116 @@ class CongsecGUI(QMainWindow):
     def export_realtime_to_csv(self):
         self.export_to_csv()
 
+    def on_tab_changed(self, index):
+        if self.tab_widget.tabText(index) == "结果库":
+            self.refresh_db_runs()
+
+    def open_result_db(self):
+        if not os.path.exists(RESULT_DB_PATH):
+            QMessageBox.warning(self, "警告", "结果库为空，请先勾选“批量结果写入结果库”并运行批量处理")
+            return None
+        return ResultDatabase(RESULT_DB_PATH)
+
+    def refresh_db_runs(self):
+        if not os.path.exists(RESULT_DB_PATH):
+            return
+        db = ResultDatabase(RESULT_DB_PATH)
+        try:
+            runs = db.list_runs()
+        finally:
+            db.close()
+        self.db_run_combo.blockSignals(True)
+        self.db_run_combo.clear()
+        self.db_base_combo.clear()
+        self.db_base_combo.addItem("无", None)
+        for run_id, started_at, _, total_files, hit_count, label in runs:
+            text = f"#{run_id} {started_at}（{total_files} 个文件，{hit_count or 0} 条命中）"
+            if label:
+                text += f" {label}"
+            self.db_run_combo.addItem(text, run_id)
+            self.db_base_combo.addItem(text, run_id)
+        if len(runs) > 1:
+            self.db_base_combo.setCurrentIndex(2)
+        self.db_run_combo.blockSignals(False)
+        self.refresh_db_rules()
+
+    def refresh_db_rules(self):
+        run_id = self.db_run_combo.currentData()
+        if run_id is None or not os.path.exists(RESULT_DB_PATH):
+            return
+        db = ResultDatabase(RESULT_DB_PATH)
+        try:
+            rules = db.rules_of_run(run_id)
+        finally:
+            db.close()
+        for combo in (self.db_rule_combo, self.db_without_combo):
+            current = combo.currentText()
+            combo.clear()
+            combo.addItem("")
+            combo.addItems(rules)
+            combo.setEditText(current)
+
+    def _db_filters(self):
+        return {
+            "rule": self.db_rule_combo.currentText().strip() or None,
+            "without": self.db_without_combo.currentText().strip() or None,
+            "file_like": self.db_file_edit.text().strip() or None
+        }
+
+    def _run_db_query(self, query):
+        run_id = self.db_run_combo.currentData()
+        if run_id is None:
+            QMessageBox.warning(self, "警告", "请先选择运行批次")
+            return
+        db = self.open_result_db()
+        if db is None:
+            return
+        try:
+            lines = query(db, run_id, self._db_filters())
+        finally:
+            db.close()
+        self.db_result_text.setPlainText("\n".join(lines))
+
+    def db_query_hits(self):
+        def query(db, run_id, filters):
+            rows = db.query_hits(run_id, **filters)
+            lines = [f"共 {len(rows)} 条（最多显示 1000 条）", "-" * 50]
+            for keywords, file_path, line_number, nearby in rows:
+                lines.append(f"{keywords} | {file_path} | 第 {line_number} 行")
+                lines.append(nearby)
+                lines.append("-" * 50)
+            return lines
+        self._run_db_query(query)
+
+    def db_count_by_rule(self):
+        def query(db, run_id, filters):
+            lines = ["规则\t命中数\t文件数"]
+            lines += [f"{k}\t{n}\t{f}" for k, n, f in db.group_counts(run_id, "rule", **filters)]
+            return lines
+        self._run_db_query(query)
+
+    def db_count_by_file(self):
+        def query(db, run_id, filters):
+            lines = ["文件\t命中数\t规则数"]
+            lines += [f"{p}\t{n}\t{k}" for p, n, k in db.group_counts(run_id, "file", **filters)]
+            return lines
+        self._run_db_query(query)
+
+    def db_diff_runs(self):
+        base_run_id = self.db_base_combo.currentData()
+        if base_run_id is None:
+            QMessageBox.warning(self, "警告", "请选择对比批次")
+            return
+
+        def query(db, run_id, filters):
+            added, removed = db.diff_runs(run_id, base_run_id, **filters)
+            lines = [f"相比批次 #{base_run_id} 新增 {len(added)} 项:"]
+            lines += [f"  + {k} | {p}" for k, p in added]
+            lines.append(f"相比批次 #{base_run_id} 消失 {len(removed)} 项:")
+            lines += [f"  - {k} | {p}" for k, p in removed]
+            return lines
+        self._run_db_query(query)
+
     def show_batch_fullscreen(self):
         text = self.result_text.toPlainText()
         if not text.strip():
@@ -1047,9 +4425,8 @@ class ExportThread(QThread):
     def run(self):
         try:
             with open(self.filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                fieldnames = ['keywords', 'line_number', 'nearby_lines', 'nearby_chars',
-                            'down_lines', 'up_lines', 'source', 'file_path', 'exclude_text']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                fields = getattr(self.results, "fields", RESULT_FIELDS)
+                writer = csv.DictWriter(csvfile, fieldnames=fields, extrasaction='ignore')
                 writer.writeheader()
                 for result in self.results:
                     writer.writerow(result)
@@ -1057,7 +4434,187 @@ class ExportThread(QThread):
             raise e
 
 
+# -------------------- 命令行 --------------------
+def cli_db(args):
+    if not os.path.exists(args.db):
+        print(f"结果库不存在: {args.db}", file=sys.stderr)
+        return 1
+    db = ResultDatabase(args.db)
+    try:
+        if args.action == "runs":
+            print("批次\t开始时间\t结束时间\t文件数\t命中数\t标签")
+            for run_id, started_at, finished_at, total_files, hit_count, label in db.list_runs():
+                print(f"{run_id}\t{started_at}\t{finished_at or ''}\t{total_files}\t{hit_count or 0}\t{label or ''}")
+            return 0
+
+        run_id = args.run or db.latest_run()
+        if run_id is None:
+            print("结果库中没有运行记录", file=sys.stderr)
+            return 1
+        filters = {"rule": args.rule, "without": args.without, "file_like": args.file}
+        if args.action == "hits":
+            for keywords, file_path, line_number, _ in db.query_hits(run_id, limit=args.limit, **filters):
+                print(f"{keywords}\t{file_path}\t{line_number}")
+        elif args.action == "stats":
+            for key, hits, distinct in db.group_counts(run_id, args.by, **filters):
+                print(f"{key}\t{hits}\t{distinct}")
+        elif args.action == "diff":
+            base_run_id = args.base
+            if base_run_id is None:
+                row = db.conn.execute("SELECT MAX(id) FROM runs WHERE id < ?", (run_id,)).fetchone()
+                base_run_id = row[0]
+            if base_run_id is None:
+                print("没有可对比的历史批次", file=sys.stderr)
+                return 1
+            added, removed = db.diff_runs(run_id, base_run_id, **filters)
+            for keywords, file_path in added:
+                print(f"+\t{keywords}\t{file_path}")
+            for keywords, file_path in removed:
+                print(f"-\t{keywords}\t{file_path}")
+        return 0
+    finally:
+        db.close()
+
+
+def cli_worker(args):
+    if not args.token:
+        print(f"请用 --token 或环境变量 {WORKER_TOKEN_ENV} 设置共享口令，协调端需使用相同口令", file=sys.stderr)
+        return 1
+    server = ScanWorkerServer(args.token, args.host, args.port)
+    print(f"扫描节点已启动: {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cli_daemon(args):
+    if args.action == "start":
+        if not hasattr(socket, "AF_UNIX"):
+            print("当前系统不支持 Unix 套接字，无法启动常驻服务", file=sys.stderr)
+            return 1
+        if daemon_available(args.socket):
+            print(f"常驻扫描服务已在运行: {args.socket}", file=sys.stderr)
+            return 1
+        server = ScanDaemon(args.socket, args.workers)
+        print(f"常驻扫描服务已启动: {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    message = {"type": "ping" if args.action == "status" else "shutdown"}
+    try:
+        sock, stream = daemon_request(message, args.socket, timeout=5)
+    except OSError:
+        print("常驻扫描服务未运行", file=sys.stderr)
+        return 1
+    try:
+        reply = read_message(stream)
+    finally:
+        stream.close()
+        sock.close()
+    if args.action == "status":
+        stats = reply["stats"]
+        print(f"已处理任务: {stats['scans']}\t规则集缓存: {stats['rule_sets']}\t"
+              f"文件缓存: {stats['cached_files']}\t空闲引擎: {stats['idle_workers']}")
+    return 0
+
+
+def cli_scan(args):
+    # 命令行批量扫描；指定 --nodes 时作为协调端分发给扫描节点，--daemon 时交给常驻服务客户端
+    if args.daemon:
+        return congsec_client.cli_scan(args)
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    rules = [normalize_rule(kw) for kw in config.get("keywords", [])]
+    config["keywords"] = [kw for kw in rules if kw is not None and kw.get("enabled", True)]
+    if args.nodes:
+        config["worker_nodes"] = [node for node in args.nodes.split(",") if node.strip()]
+    if args.token:
+        config["worker_token"] = args.token
+    if args.processes is not None:
+        config["scan_processes"] = args.processes
+    if args.label:
+        config["run_label"] = args.label
+    files = congsec_client.collect_files(args.paths)
+
+    worker = WorkerThread(config, files, config.get("auto_detect_encoding", True))
+    outcome = {}
+    worker.error_signal.connect(lambda message: print(message, file=sys.stderr))
+    worker.result_signal.connect(lambda summary, store: outcome.update(summary=summary, store=store))
+    worker.run()
+    if "store" not in outcome:
+        return 1
+    store = outcome["store"]
+    try:
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                for text in store.iter_texts():
+                    f.write(text + "\n\n")
+        print(outcome["summary"])
+    finally:
+        store.close()
+    return 0
+
+
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="congsec.py", description="文本批量处理工具命令行，不带参数启动图形界面")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    db_parser = subparsers.add_parser("db", help="查询结果库")
+    db_parser.add_argument("action", choices=["runs", "hits", "stats", "diff"],
+                           help="runs: 运行列表; hits: 命中明细; stats: 分组统计; diff: 批次对比")
+    db_parser.add_argument("--db", default=RESULT_DB_PATH, help="结果库路径")
+    db_parser.add_argument("--run", type=int, help="运行批次，默认最新一次")
+    db_parser.add_argument("--base", type=int, help="对比批次，默认上一次")
+    db_parser.add_argument("--rule", help="命中该规则（关键字串，如 \"interface + shutdown\"）")
+    db_parser.add_argument("--without", help="且所在文件未命中该规则")
+    db_parser.add_argument("--file", help="文件路径包含")
+    db_parser.add_argument("--by", choices=["rule", "file"], default="rule", help="统计分组方式")
+    db_parser.add_argument("--limit", type=int, default=1000, help="命中明细最多输出条数")
+    db_parser.set_defaults(handler=cli_db)
+
+    daemon_parser = subparsers.add_parser("daemon", help="常驻扫描服务，保留已编译规则和文件缓存")
+    daemon_parser.add_argument("action", choices=["start", "stop", "status"], help="启动 / 停止 / 查看状态")
+    daemon_parser.add_argument("--socket", default=DAEMON_SOCKET_PATH, help="套接字路径")
+    daemon_parser.add_argument("--workers", type=int, default=DAEMON_POOL_SIZE, help="同时执行的批量任务数")
+    daemon_parser.set_defaults(handler=cli_daemon)
+
+    worker_parser = subparsers.add_parser("worker", help="作为扫描节点运行，接受协调端分发的文件")
+    worker_parser.add_argument("--host", default="127.0.0.1",
+                               help="监听地址，默认只监听本机；对外监听时只应暴露在可信网络中")
+    worker_parser.add_argument("--port", type=int, default=DEFAULT_WORKER_PORT, help="监听端口")
+    worker_parser.add_argument("--token", default=os.environ.get(WORKER_TOKEN_ENV),
+                               help=f"共享口令，协调端需使用相同口令，默认取环境变量 {WORKER_TOKEN_ENV}")
+    worker_parser.set_defaults(handler=cli_worker)
+
+    scan_parser = subparsers.add_parser("scan", help="批量扫描文件或目录")
+    scan_parser.add_argument("paths", nargs="+", help="文件或目录（递归）")
+    scan_parser.add_argument("--config", default=CONFIG_PATH, help="规则配置文件")
+    scan_parser.add_argument("--nodes", help="扫描节点列表 host:port，逗号分隔；不指定时在本机扫描")
+    scan_parser.add_argument("--token", default=os.environ.get(WORKER_TOKEN_ENV),
+                             help=f"扫描节点的共享口令，默认取配置文件或环境变量 {WORKER_TOKEN_ENV}")
+    scan_parser.add_argument("--report", help="完整报告输出路径")
+    scan_parser.add_argument("--label", help="写入结果库时的批次标签，默认为所扫描文件的公共目录")
+    scan_parser.add_argument("--processes", type=int, help="本机并行扫描进程数，默认取配置文件")
+    scan_parser.add_argument("--daemon", action="store_true", help="提交给常驻扫描服务执行，不能与 --nodes / --processes 同用")
+    scan_parser.add_argument("--socket", default=DAEMON_SOCKET_PATH, help="常驻扫描服务套接字路径")
+    scan_parser.set_defaults(handler=cli_scan)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     os.environ["QT_DEVICE_PIXEL_RATIO"] = "0"
     os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
     os.environ["QT_SCREEN_SCALE_FACTORS"] = "1"
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# congsec_client.py
+# 常驻扫描服务的客户端，只依赖标准库：命令行 scan --daemon 不必加载 PyQt5、NumPy、chardet 和扫描引擎。
+# 协议同分布式扫描：逐行 JSON，请求为 scan / ping / shutdown；结果行以列式批次的二进制帧传回
+import sys
+import argparse
+import json
+import os
+import socket
+
+DAEMON_SOCKET_PATH = os.path.join("data", "congsec.sock")
+CONFIG_PATH = "config.json"
+# 常驻服务只接受这些扫描选项；结果库路径、扫描节点、口令、进程数等由服务自身的配置决定，带其他键的请求被拒绝
+DAEMON_CONFIG_KEYS = (
+    "keywords", "nearby_lines", "nearby_chars", "down_lines", "up_lines", "auto_detect_encoding",
+    "memory_budget_mb", "file_time_budget", "file_size_budget_mb", "long_line_chars", "aggregate_hits",
+    "dedup_files", "structured_tables", "context_merge", "output_mode", "max_hits", "persist_results", "run_label",
+)
+
+
+def send_message(stream, message):
+    stream.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def read_message(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("连接已断开")
+    return json.loads(line)
+
+
+def daemon_request(message, path=DAEMON_SOCKET_PATH, timeout=None):
+    # 连接常驻服务并发出请求，返回 (套接字, 读写流)；服务未运行时抛出 OSError
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("当前系统不支持 Unix 套接字")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    stream = sock.makefile("rwb")
+    send_message(stream, message)
+    return sock, stream
+
+
+def daemon_available(path=DAEMON_SOCKET_PATH):
+    try:
+        sock, stream = daemon_request({"type": "ping"}, path, timeout=1)
+    except OSError:
+        return False
+    try:
+        return read_message(stream)["type"] == "pong"
+    except (OSError, ValueError):
+        return False
+    finally:
+        stream.close()
+        sock.close()
+
+
+def daemon_config(config):
+    return {key: config[key] for key in DAEMON_CONFIG_KEYS if key in config}
+
+
+def daemon_messages(stream):
+    # 逐条产出扫描任务的回复 (消息, 二进制帧)，读到 done 为止；只有 batch 消息带二进制帧
+    while True:
+        message = read_message(stream)
+        if message["type"] == "rejected":
+            raise ValueError(message["message"])
+        payload = None
+        if message["type"] == "batch":
+            payload = bytearray(message["size"])
+            view = memoryview(payload)
+            received = 0
+            while received < len(payload):
+                n = stream.readinto(view[received:])
+                if not n:
+                    raise ConnectionError("连接已断开")
+                received += n
+        yield message, payload
+        if message["type"] == "done":
+            return
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files.append(path)
+    return files
+
+
+def cli_scan(args):
+    # 提交给常驻服务的命令行扫描：规则由服务补全默认值并筛选已启用的，报告按收到的顺序写出，不要求回传结果行
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = daemon_config(json.load(f))
+    if args.label:
+        config["run_label"] = args.label
+    # 服务进程的工作目录可能不同，路径一律转成绝对路径
+    files = [os.path.abspath(file_path) for file_path in collect_files(args.paths)]
+    try:
+        sock, stream = daemon_request({"type": "scan", "config": config, "files": files, "rows": False},
+                                      args.socket)
+    except OSError:
+        print("常驻扫描服务未运行", file=sys.stderr)
+        return 1
+    report = None
+    try:
+        if args.report:
+            report = open(args.report, 'w', encoding='utf-8')
+        for message, _ in daemon_messages(stream):
+            if message["type"] == "error":
+                print(message["message"], file=sys.stderr)
+            elif message["type"] == "texts" and report is not None:
+                for text in message["items"]:
+                    report.write(text + "\n\n")
+            elif message["type"] == "done":
+                print(message["summary"])
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"常驻扫描服务出错: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        if report is not None:
+            report.close()
+        stream.close()
+        sock.close()
+
+
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="congsec.py", description="提交批量扫描任务给常驻扫描服务")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    scan_parser = subparsers.add_parser("scan", help="批量扫描文件或目录")
+    scan_parser.add_argument("paths", nargs="+", help="文件或目录（递归）")
+    scan_parser.add_argument("--config", default=CONFIG_PATH, help="规则配置文件")
+    scan_parser.add_argument("--report", help="完整报告输出路径")
+    scan_parser.add_argument("--label", help="写入结果库时的批次标签，默认为所扫描文件的公共目录")
+    scan_parser.add_argument("--daemon", action="store_true", required=True, help="提交给常驻扫描服务执行")
+    scan_parser.add_argument("--socket", default=DAEMON_SOCKET_PATH, help="常驻扫描服务套接字路径")
+    scan_parser.set_defaults(handler=cli_scan)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+def main():
+    sys.exit(run_cli(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    main()
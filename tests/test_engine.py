@@ -0,0 +1,379 @@
+import hashlib
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import congsec  # noqa: E402
+import congsec_client  # noqa: E402
+
+# 由基线版本（重构前）的 process_text 在同样输入上生成：结果正文和结果行的摘要、超长行的命中行号
+BASELINE_CASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "baseline_cases.json")
+VOCAB = ['interface', 'shutdown', 'vlan', 'ip', 'address', 'description', 'permit', 'deny', 'any', 'x', 'aa',
+         'face', 'ip ad']
+
+
+def scan_text(text, rules, **options):
+    config = {"keywords": rules, "nearby_lines": 2, "nearby_chars": 20, "down_lines": 0, "up_lines": 0}
+    config.update(options)
+    return congsec.WorkerThread(config, []).process_text(text, config, "test.cfg")
+
+
+def digest(result_text, rows):
+    payload = json.dumps([result_text, rows], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class without_numpy:
+    # 临时停用 NumPy，覆盖纯 Python 回退路径
+    def __enter__(self):
+        self.saved, congsec.np = congsec.np, None
+
+    def __exit__(self, *exc):
+        congsec.np = self.saved
+
+
+class BaselineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(BASELINE_CASES, encoding="utf-8") as f:
+            cls.cases = json.load(f)
+
+    def check_cases(self, cases):
+        for numpy in (True, False):
+            for i, case in enumerate(cases):
+                with self.subTest(case=i, numpy=numpy):
+                    if numpy:
+                        result = scan_text(case["text"], case["keywords"])
+                    else:
+                        with without_numpy():
+                            result = scan_text(case["text"], case["keywords"])
+                    self.assertEqual(digest(*result), case["digest"])
+
+    def test_rules_match_baseline(self):
+        self.check_cases(self.cases["rules"])
+
+    def test_large_rule_library_matches_baseline(self):
+        self.check_cases(self.cases["library"])
+
+    def test_long_line_hits_match_baseline(self):
+        text = "head\n" + " ".join(VOCAB[i * 7 % len(VOCAB)] for i in range(30000)) + "\ntail ip\n"
+        for case in self.cases["long_line"]:
+            with self.subTest(words=case["keywords"][0]["words"]):
+                _, rows = scan_text(text, case["keywords"])
+                self.assertEqual(sorted({row["line_number"] for row in rows}), case["lines"])
+
+
+class OutputModeTest(unittest.TestCase):
+    text = "\n".join(" ".join(VOCAB[(i * 5 + j) % len(VOCAB)] for j in range(i % 6)) for i in range(300))
+    rules = [{"words": ["ip", "vlan"], "nearby_lines": 1, "multi_line_exclude": True},
+             {"words": ["deny"], "exclude": ["any"]},
+             {"words": ["interface", "shutdown"], "nearby_chars": 40}]
+
+    def by_rule(self, rows):
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row["keywords"], []).append(row)
+        return grouped
+
+    def test_summary_modes_agree_with_full(self):
+        full = self.by_rule(scan_text(self.text, self.rules)[1])
+        self.assertTrue(full)
+        count = self.by_rule(scan_text(self.text, self.rules, output_mode="count")[1])
+        files = self.by_rule(scan_text(self.text, self.rules, output_mode="files")[1])
+        self.assertEqual(set(count), set(full))
+        self.assertEqual(set(files), set(full))
+        for label, rows in full.items():
+            self.assertEqual(count[label][0]["hit_count"], len(rows))
+            self.assertEqual(count[label][0]["line_number"], rows[0]["line_number"])
+            self.assertEqual(files[label][0]["line_number"], rows[0]["line_number"])
+
+    def test_max_hits_keeps_first_hits(self):
+        full = self.by_rule(scan_text(self.text, self.rules)[1])
+        limited = self.by_rule(scan_text(self.text, self.rules, max_hits=2)[1])
+        for label, rows in full.items():
+            self.assertEqual(limited[label], rows[:2])
+
+
+class DedupTest(unittest.TestCase):
+    def run_scan(self, files, dedup):
+        config = {"keywords": [{"words": ["ip", "vlan"]}, {"words": ["deny"]}], "nearby_lines": 1,
+                  "nearby_chars": 20, "down_lines": 0, "up_lines": 0, "dedup_files": dedup,
+                  "persist_results": False, "auto_export": False, "memory_budget_mb": 0}
+        worker = congsec.WorkerThread(config, files)
+        outcome = {}
+        worker.result_signal.connect(lambda summary, store: outcome.update(store=store))
+        worker.run()
+        store = outcome["store"]
+        try:
+            return sorted((row["file_path"], row["keywords"], row["line_number"], row["nearby_lines"])
+                          for row in store)
+        finally:
+            store.close()
+
+    def test_duplicate_files_get_same_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            files = []
+            for name, body in (("a.cfg", "vlan 1\nip x\ndeny\n"), ("b.cfg", "vlan 1\nip x\ndeny\n"),
+                               ("c.cfg", "deny any\n"), ("d.cfg", "vlan 1\nip x\ndeny\n")):
+                path = os.path.join(directory, name)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(body)
+                files.append(path)
+            self.assertEqual(self.run_scan(files, True), self.run_scan(files, False))
+
+
+class AggregatorTest(unittest.TestCase):
+    def run_scan(self, files, **options):
+        config = {"keywords": [{"words": ["deny"]}], "nearby_lines": 1, "nearby_chars": 20,
+                  "down_lines": 0, "up_lines": 0, "aggregate_hits": True, "persist_results": False,
+                  "auto_export": False, "memory_budget_mb": 0}
+        config.update(options)
+        worker = congsec.WorkerThread(config, files)
+        outcome = {}
+        worker.result_signal.connect(lambda summary, store: outcome.update(summary=summary, store=store))
+        worker.run()
+        store = outcome["store"]
+        try:
+            return outcome["summary"], list(store)
+        finally:
+            store.close()
+
+    def write_files(self, directory, count):
+        files = []
+        for i in range(count):
+            path = os.path.join(directory, f"{i:03d}.cfg")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("deny\n")
+            files.append(path)
+        return files
+
+    def test_summary_modes_keep_rows_per_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            files = self.write_files(directory, 3)
+            for mode in ("count", "files"):
+                _, rows = self.run_scan(files, output_mode=mode)
+                self.assertEqual(sorted(row["file_path"] for row in rows), files)
+
+    def test_budget_caps_file_lists(self):
+        with tempfile.TemporaryDirectory() as directory:
+            files = self.write_files(directory, 30)
+            aggregator = congsec.HitAggregator(memory_budget_mb=0)
+            capped = congsec.HitAggregator(memory_budget_mb=0)
+            capped.memory_budget = 1
+            for file_path in files:
+                row = {"file_path": file_path, "keywords": "deny", "line_number": 1, "nearby_lines": "deny",
+                       "nearby_chars": "", "down_lines": "", "up_lines": ""}
+                aggregator.add([row])
+                capped.add([dict(row)])
+            self.assertFalse(aggregator.capped)
+            self.assertTrue(capped.capped)
+            _, (full,) = aggregator.report()
+            text, (short,) = capped.report()
+            self.assertEqual(full["files"], "; ".join(files))
+            self.assertEqual(short["hit_count"], 30)
+            self.assertTrue(short["files"].endswith("……等 30 个文件"))
+            self.assertEqual(short["files"].count(";"), congsec.AGGREGATE_DISPLAY_FILES)
+            self.assertIn("涉及 30 个文件", text)
+
+
+class BlockIndexTest(unittest.TestCase):
+    text = ("hostname R1\n!\ninterface Gi0/1\n description up\n shutdown\n\nrouter bgp 1\n"
+            " neighbor 1.1.1.1 remote-as 2\n address-family ipv4\n  network 10.0.0.0\n exit-address-family\n"
+            "interfaces {\n    ge-0/0/0 {\n        unit 0;\n    }\n}\nend\n")
+    # 各行所在最内层块的 (起始行, 结束行)，从 0 开始、左闭右开
+    expected = [(0, 1), (1, 2), (2, 6), (2, 6), (2, 6), (2, 6), (6, 11), (6, 11), (8, 10), (8, 10), (6, 11),
+                (11, 16), (12, 15), (12, 15), (12, 15), (11, 16), (16, 17)]
+
+    def blocks(self):
+        index = congsec.LineIndex(self.text)
+        blocks = congsec.BlockIndex(index)
+        return [blocks.block_of(i) for i in range(len(index))]
+
+    def test_innermost_block(self):
+        self.assertEqual(self.blocks(), self.expected)
+        index = congsec.LineIndex(self.text)
+        starts, ends = congsec.BlockIndex(index).blocks_of(congsec.np.arange(len(index)))
+        self.assertEqual(list(zip(starts.tolist(), ends.tolist())), self.expected)
+        with without_numpy():
+            self.assertEqual(self.blocks(), self.expected)
+
+    def test_block_rule_uses_nested_block(self):
+        rule = {"words": ["network", "address-family"], "context_mode": "block"}
+        _, rows = scan_text(self.text, [rule])
+        self.assertEqual([row["line_number"] for row in rows], [10])
+        self.assertEqual(rows[0]["nearby_lines"], " address-family ipv4\n  network 10.0.0.0")
+        _, rows = scan_text(self.text, [{"words": ["unit", "ge-0/0/0"], "context_mode": "block"}])
+        self.assertEqual(rows[0]["nearby_lines"], "    ge-0/0/0 {\n        unit 0;\n    }")
+        _, rows = scan_text(self.text, [{"words": ["network", "remote-as"], "context_mode": "block"}])
+        self.assertEqual(rows, [])
+
+
+class ResultDatabaseTest(unittest.TestCase):
+    def test_run_config_has_no_token(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "a.cfg")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("vlan 1\n")
+            db_path = os.path.join(directory, "results.db")
+            config = {"keywords": [{"words": ["vlan"]}], "nearby_lines": 1, "nearby_chars": 20, "down_lines": 0,
+                      "up_lines": 0, "persist_results": True, "result_db_path": db_path,
+                      "worker_token": "s3cret-token", "auto_export": False}
+            worker = congsec.WorkerThread(config, [path])
+            worker.result_signal.connect(lambda summary, store: store.close())
+            worker.run()
+            db = congsec.ResultDatabase(db_path)
+            try:
+                stored = [row[0] for row in db.conn.execute("SELECT config FROM runs")]
+            finally:
+                db.close()
+            self.assertEqual(len(stored), 1)
+            self.assertNotIn("s3cret-token", stored[0])
+            self.assertNotIn("worker_token", json.loads(stored[0]))
+
+    def test_rules_with_same_words_keep_their_ids(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "a.cfg")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("vlan 1\nvlan 2\n")
+            db_path = os.path.join(directory, "results.db")
+            config = {"keywords": [{"words": ["vlan"]}, {"words": ["vlan"], "exclude": ["2"]}], "nearby_lines": 0,
+                      "nearby_chars": 20, "down_lines": 0, "up_lines": 0, "persist_results": True,
+                      "result_db_path": db_path, "auto_export": False}
+            worker = congsec.WorkerThread(config, [path])
+            worker.result_signal.connect(lambda summary, store: store.close())
+            worker.run()
+            db = congsec.ResultDatabase(db_path)
+            try:
+                hits = db.conn.execute("SELECT rule_id, line_number FROM hits ORDER BY rule_id, line_number").fetchall()
+                hashes = [row[0] for row in db.conn.execute("SELECT rule_hash FROM rules ORDER BY rule_id")]
+                label = db.list_runs()[0][5]
+            finally:
+                db.close()
+            self.assertEqual(hits, [(0, 1), (0, 2), (1, 1)])
+            self.assertEqual(len(set(hashes)), 2)
+            self.assertEqual(label, path)
+
+
+class CoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        self.server = congsec.ScanWorkerServer("right", "127.0.0.1", 0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.node = "127.0.0.1:%d" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_rejected_node_fails_fast(self):
+        config = {"keywords": [{"words": ["vlan"]}], "worker_token": "wrong"}
+        coordinator = congsec.ScanCoordinator([self.node], config, ["a.cfg", "b.cfg"])
+        results = list(coordinator.scan())
+        self.assertEqual(sorted(path for path, *_ in results), ["a.cfg", "b.cfg"])
+        self.assertTrue(all("共享口令不正确" in error for _, _, error, _ in results))
+        self.assertEqual(coordinator.attempts, {})
+        self.assertEqual(list(coordinator.lost.values()), ["共享口令不正确"])
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "需要 Unix 套接字")
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "congsec.sock")
+        self.server = congsec.ScanDaemon(self.path, 1)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.file_path = os.path.join(self.directory.name, "a.cfg")
+        with open(self.file_path, "w", encoding="utf-8") as f:
+            f.write("vlan 1\ninterface x\n")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def scan(self, config):
+        sock, stream = congsec_client.daemon_request(
+            {"type": "scan", "config": config, "files": [self.file_path], "rows": False}, self.path, timeout=10)
+        try:
+            return [message for message, _ in congsec_client.daemon_messages(stream)]
+        finally:
+            stream.close()
+            sock.close()
+
+    def test_socket_is_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_rejects_unlisted_config_keys(self):
+        config = {"keywords": [{"words": ["vlan"]}], "result_db_path": os.path.join(self.directory.name, "x.db"),
+                  "persist_results": True}
+        with self.assertRaisesRegex(ValueError, "result_db_path"):
+            self.scan(config)
+        self.assertFalse(os.path.exists(config["result_db_path"]))
+
+    def test_scan_matches_local(self):
+        config = {"keywords": [{"words": ["vlan"]}], "nearby_lines": 0, "nearby_chars": 20, "down_lines": 0,
+                  "up_lines": 0}
+        messages = self.scan(config)
+        texts = [text for message in messages if message["type"] == "texts" for text in message["items"]]
+        with open(self.file_path, encoding="utf-8") as f:
+            local, _ = congsec.WorkerThread(config, []).process_text(f.read(), config, self.file_path)
+        self.assertEqual(texts, [local])
+        self.assertEqual(messages[-1]["type"], "done")
+
+
+class FoldTest(unittest.TestCase):
+    text = "hostname R1\nINTERFACE ＧｉｇａｂｉｔＥｔｈｅｒｎｅｔ0/1\n shutdown\nStraße ﬁle İx\u2028end\n"
+
+    def test_fold_keeps_offsets(self):
+        for nfkc, lower in ((False, True), (True, False), (True, True)):
+            folded = congsec.fold_text(self.text, nfkc, lower)
+            self.assertEqual(len(folded), len(self.text))
+            for original, char in zip(self.text, folded):
+                self.assertEqual(char, congsec.fold_text(original, nfkc, lower))
+            index = congsec.LineIndex(self.text)
+            self.assertEqual(list(congsec.LineIndex(folded).starts), list(index.starts))
+
+    def test_context_comes_from_original_text(self):
+        rule = {"words": ["interface", "gigabitethernet"], "ignore_case": True, "nfkc": True, "nearby_chars": 30}
+        _, rows = scan_text(self.text, [rule], nearby_lines=0)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["nearby_lines"], "INTERFACE ＧｉｇａｂｉｔＥｔｈｅｒｎｅｔ0/1")
+        self.assertTrue(rows[0]["nearby_chars"].startswith("[INTERFACE]"))
+
+
+class LongLineTest(unittest.TestCase):
+    def test_multi_line_word_across_segment_cut(self):
+        rule = {"words": ["cab", "b"], "multi_line_exclude": True, "nearby_lines": 0}
+        for long_line_chars in (0, 8):
+            _, rows = scan_text("x\nc;c;a; cabc\n", [rule], long_line_chars=long_line_chars)
+            self.assertEqual([row["line_number"] for row in rows], [2])
+
+    def test_keyword_across_segment_cut(self):
+        text = "x" * 995 + "password=secret" + "y" * 2000
+        _, rows = scan_text(text, [{"words": ["password=secret"]}], long_line_chars=1000)
+        self.assertEqual(len(rows), 1)
+
+    def test_table_size_budget(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "flows.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("src,action\n")
+                f.writelines(f"10.0.0.{i % 250},deny\n" for i in range(200000))
+            config = {"keywords": [{"words": ["deny"], "columns": ["action"]}], "nearby_lines": 0,
+                      "nearby_chars": 20, "down_lines": 0, "up_lines": 0, "output_mode": "count",
+                      "file_size_budget_mb": 1}
+            worker = congsec.WorkerThread(config, [])
+            _, rows = worker.process_table(path, config)
+            self.assertLess(rows[0]["hit_count"], 200000)
+            self.assertEqual(len(worker.overruns), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()